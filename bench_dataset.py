@@ -0,0 +1,165 @@
+## ===================================================================================
+## DATASET GENERATOR BENCHMARKS
+## Times every fake_* generator on its own (rows/sec) and the end-to-end pipeline at
+## several sizes, and prints the results as JSON so runs can be compared over time
+## ===================================================================================
+
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import gen_dataset as gd
+
+DEFAULT_SIZES = (1000,100000,1000000)
+
+## ===================================================================================
+##   GENERATORS: each entry makes one value per call from a seeded random.Random
+## ===================================================================================
+
+def generator_cases():
+    name_gen = gd.get_name_generator()
+    counts = gd.CountDistribution(0,200,14000)
+    return {
+        'fake_sentence': lambda rng: gd.fake_sentence(rng),
+        'fake_email': lambda rng: gd.fake_email(rng=rng),
+        'fake_url': lambda rng: gd.fake_url(rng),
+        'fake_hashtag': lambda rng: gd.fake_hashtag(rng),
+        'fake_domain': lambda rng: gd.fake_domain(rng),
+        'fake_account': lambda rng: gd.fake_account(rng),
+        'fake_num': lambda rng: gd.fake_num(rng=rng),
+        'CountDistribution': lambda rng: counts.draw(rng),
+        'fake_date': lambda rng: gd.fake_date(rng=rng),
+        'get_nickname': lambda rng: name_gen.get_nickname(rng=rng),
+        'FakeUser': lambda rng: gd.FakeUser(rng),
+    }
+
+# Calls func in batches until at least duration seconds have passed
+def time_generator(func,seed=0,duration=1.0):
+    rng = random.Random(seed)
+    func(rng)                                   # warm up (config loading, lazy imports)
+    calls = 0
+    batch = 100
+    start = time.perf_counter()
+    elapsed = 0.0
+    while elapsed < duration:
+        for ind in range(batch):
+            func(rng)
+        calls += batch
+        elapsed = time.perf_counter()-start
+    return {'calls': calls,'seconds': elapsed,'rows_per_sec': calls/elapsed}
+
+def bench_generators(names=None,seed=0,duration=1.0):
+    cases = generator_cases()
+    results = {}
+    for name,func in cases.items():
+        if names is None or name in names:
+            results[name] = time_generator(func,seed,duration)
+    return results
+
+## ===================================================================================
+##   PIPELINE: DatasetGenerator.generate() -> DataFrame -> CSV, one child process per
+##   size so that the peak RSS reported belongs to that size alone
+## ===================================================================================
+
+# Peak resident set size of this process in bytes (None where resource is unavailable)
+def peak_rss():
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == 'darwin' else rss*1024
+
+def bench_pipeline(num,seed=0,config='cfg_gen_dataset.txt'):
+    import pandas as pd
+    result = {'rows': num}
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        dataset = gd.DatasetGenerator(seed=seed,config=config)
+        result['setup_seconds'] = time.perf_counter()-start
+
+        # Row path: list of dicts, as returned by generate()
+        start = time.perf_counter()
+        rows = dataset.generate(num)
+        result['generate_seconds'] = time.perf_counter()-start
+        start = time.perf_counter()
+        frame = pd.DataFrame(rows)
+        result['frame_seconds'] = time.perf_counter()-start
+        del rows
+        start = time.perf_counter()
+        frame.to_csv(os.path.join(tmp,'rows.csv'))
+        result['csv_seconds'] = time.perf_counter()-start
+        del frame
+        total = result['generate_seconds']+result['frame_seconds']+result['csv_seconds']
+        result['rows_per_sec'] = num/total
+
+        # Column path: generate_frame() and the chunked writer
+        start = time.perf_counter()
+        dataset.generate_frame(num)
+        result['generate_frame_seconds'] = time.perf_counter()-start
+        start = time.perf_counter()
+        dataset.write(os.path.join(tmp,'chunks.csv'),num)
+        result['write_csv_seconds'] = time.perf_counter()-start
+        result['write_rows_per_sec'] = num/result['write_csv_seconds']
+    result['peak_rss_bytes'] = peak_rss()
+    return result
+
+# Runs bench_pipeline for one size in a fresh interpreter and returns its results
+def run_pipeline(num,seed=0,config='cfg_gen_dataset.txt'):
+    cmd = [sys.executable,os.path.abspath(__file__),'--pipeline-child',str(num),'--seed',str(seed),'--config',config]
+    proc = subprocess.run(cmd,capture_output=True,text=True)
+    if proc.returncode != 0:
+        return {'rows': num,'error': proc.stderr.strip().splitlines()[-1:]}
+    return json.loads(proc.stdout)
+
+## ===================================================================================
+##   MAIN
+## ===================================================================================
+
+def environment():
+    import numpy as np
+    import pandas as pd
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+    }
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description='Benchmark the dataset generators and write the results as JSON')
+    parser.add_argument('-o','--output',default=None,help='JSON file to write (default: stdout)')
+    parser.add_argument('--sizes',type=int,nargs='*',default=list(DEFAULT_SIZES),help='row counts for the end-to-end runs')
+    parser.add_argument('--only',nargs='*',default=None,help='generators to time (default: all)')
+    parser.add_argument('--duration',type=float,default=1.0,help='seconds spent timing each generator')
+    parser.add_argument('--seed',type=int,default=0,help='seed used for every run')
+    parser.add_argument('--config',default='cfg_gen_dataset.txt',help='dataset config for the end-to-end runs')
+    parser.add_argument('--skip-generators',action='store_true',help='only run the end-to-end benchmarks')
+    parser.add_argument('--pipeline-child',type=int,default=None,help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.pipeline_child is not None:
+        print(json.dumps(bench_pipeline(args.pipeline_child,args.seed,args.config)))
+        return
+
+    results = {'environment': environment(),'seed': args.seed}
+    if not args.skip_generators:
+        results['generators'] = bench_generators(args.only,args.seed,args.duration)
+    results['pipeline'] = [run_pipeline(num,args.seed,args.config) for num in args.sizes]
+
+    text = json.dumps(results,indent=2)
+    if args.output is None:
+        print(text)
+    else:
+        with open(args.output,'w') as f:
+            f.write(text+'\n')
+
+if __name__ == '__main__':
+    main()
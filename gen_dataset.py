@@ -6,8 +6,11 @@
 import random
 import os
 import re
-import pandas as pd
-from anyascii import anyascii 
+import time
+import bisect
+
+# numpy, pandas and anyascii are imported where they are used, so that importing this
+# module as a library stays cheap
 
 ASSETS_DIR = os.path.dirname(os.path.abspath(__file__))
 
@@ -22,16 +25,51 @@ def resource_path(relative_path):
 ## UTILITY FUNCTIONS
 ## ===================================================================================
 
-## Select item from given list
-def choose(itemlist):
+## Select item from given list. rng can be the random module (the default), a random.Random
+## instance or a NumpyRandom - Random.choice picks the index with getrandbits
+def choose(itemlist,rng=random):
     item = None
     if len(itemlist)>0:
-        item = itemlist[random.randint(0,len(itemlist)-1)]
+        item = rng.choice(itemlist)
     return item
 
 ## Generate a number between 1 and num
-def roll(num=6):
-    return random.randint(1,num)
+def roll(num=6,rng=random):
+    return rng.randrange(num)+1
+
+## Returns a random.Random-compatible generator: an int seed or None gives a new random.Random,
+## a numpy Generator is wrapped in NumpyRandom and Random instances are returned as they are
+def make_rng(rng=None):
+    if isinstance(rng,random.Random):
+        return rng
+    if hasattr(rng,'bit_generator'):      # numpy Generator
+        return NumpyRandom(rng)
+    return random.Random(rng)
+
+## random.Random driven by a numpy Generator, so that choose(), roll() and the fake_*
+## functions can share one stream with the batch engine
+class NumpyRandom(random.Random):
+    def __init__(self,generator=None):
+        import numpy as np
+        self.generator = generator if generator is not None else np.random.default_rng()
+        super().__init__()
+
+    def seed(self,a=None,version=2):
+        import numpy as np
+        if a is not None:
+            self.generator = np.random.default_rng(a)
+
+    def random(self):
+        return self.generator.random()
+
+    def getrandbits(self,k):
+        return int.from_bytes(self.generator.bytes((k+7)//8),'little') >> (-k % 8)
+
+    def getstate(self):
+        return self.generator.bit_generator.state
+
+    def setstate(self,state):
+        self.generator.bit_generator.state = state
 
 ## Add the correct article to a word ('an' for words beginning with vowel sounds, 'a' for all others)
 def add_article(st):
@@ -68,6 +106,114 @@ def make_plural(word):
                 result = word+'s'
     return result    
 
+## ===================================================================================
+##    CONFIG CACHE: Parsed word list configs (cfg_gen_base.txt, cfg_gen_names.txt) are
+##    pickled to CACHE_DIR, together with their folded forms, and reloaded in a single
+##    read while the source file is unchanged. Within a process each file is only
+##    loaded once and the lists are shared
+## ===================================================================================
+
+# Set PYDATASETGEN_CACHE to another directory, or to an empty string to turn the cache off
+CACHE_DIR = os.environ.get('PYDATASETGEN_CACHE',os.path.join(os.path.expanduser('~'),'.cache','pyDatasetGen'))
+CACHE_VERSION = 2
+
+# Precomputed forms of every config entry, used to build emails, handles, domains, URLs
+# and hashtags without running anyascii or re.sub on every row:
+#   ascii   - ASCII-folded, lowercased, spaces removed  (Lǐ -> li, forest fire -> forestfire)
+#   handle  - ASCII-folded, lowercased, spaces as '_'   (forest fire -> forest_fire)
+#   compact - spaces removed, otherwise unchanged      (Las Vegas -> LasVegas)
+FORMS = ('ascii','handle','compact')
+
+_configs = {}
+
+# Parse a word list config: each name=[a,b,c] line becomes a key with a list of strings
+def parse_config(text,filename=''):
+    config = {}
+    for lineno,line in enumerate(text.splitlines(),1):
+        if line.startswith('#') or not line.strip():  # Ignore comments and empty lines
+            continue
+        if '=' not in line:
+            raise ValueError(f'{filename}:{lineno}: expected name=[list], got {line.strip()!r}')
+        key,value = line.split('=',1)
+        value = value.replace('[','').replace(']','')   # Anything between [] is interpreted as a list/array
+        config[key.strip()] = value.strip().split(',')
+    return config
+
+# Returns text in one of the FORMS
+def fold_text(text,form='ascii'):
+    if form == 'compact':
+        return text.replace(' ','')
+    from anyascii import anyascii
+    return anyascii(text).lower().replace(' ','_' if form == 'handle' else '')
+
+# Returns {form: {key: list}} with lists parallel to the lists in config
+def fold_config(config):
+    from anyascii import anyascii
+    forms = {form: {} for form in FORMS}
+    for key,values in config.items():
+        folded = [anyascii(value).lower() for value in values]
+        forms['ascii'][key] = [value.replace(' ','') for value in folded]
+        forms['handle'][key] = [value.replace(' ','_') for value in folded]
+        forms['compact'][key] = [value.replace(' ','') for value in values]
+    return forms
+
+# Returns the parsed config for filename - from memory, then the cache file, then the source
+def load_config(filename):
+    return load_entry(filename)['config']
+
+# Returns the folded FORMS of every entry in filename (see fold_config)
+def load_forms(filename):
+    return load_entry(filename)['forms']
+
+# Returns the cache entry ({'config':..., 'forms':...}) for filename
+def load_entry(filename):
+    import hashlib
+    import pickle
+
+    path = resource_path(filename)
+    if path in _configs:
+        return _configs[path]
+
+    stat = os.stat(path)
+    cache_file = None
+    cached = None
+    if CACHE_DIR:
+        key = hashlib.sha1(os.path.abspath(path).encode('utf-8')).hexdigest()[0:16]
+        cache_file = os.path.join(CACHE_DIR,f'{os.path.basename(path)}-{key}.pickle')
+        try:
+            with open(cache_file,'rb') as handle:
+                cached = pickle.load(handle)
+        except (OSError,pickle.UnpicklingError,EOFError,ValueError):
+            cached = None
+        if not (isinstance(cached,dict) and cached.get('version') == CACHE_VERSION):
+            cached = None
+
+    # Unchanged mtime and size: trust the cache without reading the source at all
+    if cached and cached['mtime'] == stat.st_mtime_ns and cached['size'] == stat.st_size:
+        entry = cached['entry']
+    else:
+        with open(path,'rb') as handle:
+            raw = handle.read()
+        digest = hashlib.sha1(raw).hexdigest()
+        if cached and cached['sha1'] == digest:     # touched but not edited
+            entry = cached['entry']
+        else:
+            config = parse_config(raw.decode('utf-8'),filename)
+            entry = {'config':config,'forms':fold_config(config)}
+        if cache_file:
+            cached = {'version':CACHE_VERSION,'mtime':stat.st_mtime_ns,'size':stat.st_size,'sha1':digest,'entry':entry}
+            try:
+                os.makedirs(CACHE_DIR,exist_ok=True)
+                tmp_file = f'{cache_file}.{os.getpid()}.tmp'
+                with open(tmp_file,'wb') as handle:
+                    pickle.dump(cached,handle,pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp_file,cache_file)
+            except OSError:
+                pass    # the cache is only an optimisation - a read-only home directory is fine
+
+    _configs[path] = entry
+    return entry
+
 ## ===================================================================================
 ##    VOCAB: Container object for managing word lists from an external config file. 
 ##           Should contain NOUNS, ADJECTIVES, ACTORS, PLACES, and GROUP terms
@@ -75,139 +221,552 @@ def make_plural(word):
 ## ===================================================================================
 class Vocab:
     def __init__(self,filename='cfg_gen_base.txt'):
+        self.forms = {}
         self.read(filename)
 
-    # read config file and add attributes for each entry        
+    # read config file (through the config cache) and add attributes for each entry.
+    # forms[form][key] holds the folded FORMS of each list, in the same order
     def read(self,filename):
-        try:     
-            lines = open(resource_path(filename),'r',encoding='utf-8')     
-                
-            for line in lines:                
-                if not line.startswith('#') and not line=='\n':  # Ignore comments and empty lines
-                    key,value = line.split('=')
-                    value = re.sub('\\[','',value)
-                    value = re.sub('\\]','',value)                     
-
-                    key = key.strip()
-                    value = value.strip().split(',')
-                    setattr(self,key,value)
-                    
-        except:
-            print(f'ERROR - {filename} did not finish loading')
+        for key,value in load_config(filename).items():
+            setattr(self,key,value)
+        for form,lists in load_forms(filename).items():
+            self.forms.setdefault(form,{}).update(lists)
 
     ## optional method for retrieving values by key - returns None if key doesn't exist
     def get(self,key):
-        result = None
-        if key in self.keys():
-            result = getattr(self,key)
-        return result
+        return getattr(self,key,None)
+
+_vocabs = {}
+
+# Returns the Vocab for filename, shared by every NameGenerator in the process
+def get_vocab(filename='cfg_gen_base.txt'):
+    if filename not in _vocabs:
+        _vocabs[filename] = Vocab(filename)
+    return _vocabs[filename]
         
+## ===================================================================================
+##     NAMEPOOL: All names from cfg_gen_names.txt in one flat table, with the position
+##     of each <group><kind> list kept as start/count integer arrays. A name is drawn
+##     with a single random number: its integer part picks the group (and gender when
+##     it is random) and its fraction picks the name inside that range
+## ===================================================================================
+NAME_KINDS = ('MaleGiven','FemaleGiven','Family')
+KIND_INDEX = {'male':0,'female':1,'family':2}
+
+class NamePool:
+    # config and forms are a names config and its folded FORMS (see load_entry)
+    def __init__(self,config,forms):
+        self.groups= config['name_groups']
+        self.group_index = {group: ind for ind,group in enumerate(self.groups)}
+        self.table = []
+        self.form_tables = {form: [] for form in forms}
+        start = []
+        count = []
+        for group in self.groups:
+            for kind in NAME_KINDS:
+                key = group+kind
+                if not config.get(key) or config[key] == ['']:
+                    raise ValueError(f'name list {key} is missing or empty')
+                start.append(len(self.table))
+                count.append(len(config[key]))
+                self.table.extend(config[key])
+                for form,lists in forms.items():
+                    self.form_tables[form].extend(lists[key])
+        # start[group][kind] and count[group][kind], as lists for single draws and as
+        # numpy arrays (built on the first batch) for draw_batch
+        self.start = [start[ind:ind+3] for ind in range(0,len(start),3)]
+        self.count = [count[ind:ind+3] for ind in range(0,len(count),3)]
+        self.start_array = None
+        self.count_array = None
+        self.arrays = {}
+
+    # Returns the table index of a name. kind is 'male', 'female', 'family' or 'random' 
+    # (a given name of either gender); group is an index into groups, or None for any group
+    def draw(self,rng,kind,group=None):
+        x = rng.random()
+        if group is None:
+            x *= len(self.groups)
+            group = int(x)
+            x -= group
+        if kind == 'random':
+            x *= 2
+            sub = int(x)
+            x -= sub
+        else:
+            sub = KIND_INDEX[kind]
+        return self.start[group][sub]+int(x*self.count[group][sub])
+
+    # Number of distinct names of a kind - 'given' (either gender) or 'family'
+    def distinct(self,kind):
+        subs = (0,1) if kind == 'given' else (2,)
+        return len({name for starts,counts in zip(self.start,self.count) for sub in subs
+                    for name in self.table[starts[sub]:starts[sub]+counts[sub]]})
+
+    # Returns num random group indices, for drawing names from a consistent group
+    def draw_groups(self,nprng,num):
+        return nprng.integers(0,len(self.groups),size=num)
+
+    # Vectorized draw(): returns an array of num table indices. groups may be an array of 
+    # group indices (one per name) or None for a random group per name
+    def draw_batch(self,nprng,num,kind,groups=None):
+        import numpy as np
+        if self.start_array is None:
+            self.start_array = np.array(self.start,dtype=np.intp)
+            self.count_array = np.array(self.count,dtype=np.intp)
+        x = nprng.random(num)
+        if groups is None:
+            x *= len(self.groups)
+            groups = x.astype(np.intp)
+            x -= groups
+        if kind == 'random':
+            x *= 2
+            sub = x.astype(np.intp)
+            x -= sub
+        else:
+            sub = KIND_INDEX[kind]
+        return self.start_array[groups,sub]+(x*self.count_array[groups,sub]).astype(np.intp)
+
+    # Returns the names (or one of their FORMS) at the given table indices as an object 
+    # array. form='initial' gives the ASCII-folded, lowercased first letter of each name
+    def take(self,indices,form=None):
+        import numpy as np
+        if form not in self.arrays:
+            if form is None:
+                table = self.table
+            elif form == 'initial':
+                table = [fold_text(name[0:1]) for name in self.table]
+            else:
+                table = self.form_tables[form]
+            self.arrays[form] = np.array(table,dtype=object)
+        return self.arrays[form][indices]
+
 ## ===================================================================================
 ##     NAMEGENERATOR:  Used to generate names. Relies on external config file.
+##     Set consistent_groups to draw a person's given and family names from one group
 ## ===================================================================================
 class NameGenerator:
-    def __init__(self,config_file='cfg_gen_names.txt'):        
-        self.read(config_file)     
-        self.vocab = Vocab()    
+    def __init__(self,config_file='cfg_gen_names.txt',rng=None,vocab=None,consistent_groups=False):
+        self.rng = make_rng(rng)
+        self.consistent_groups = consistent_groups
+        self.forms = {form: {} for form in FORMS}
+        self.vocab = vocab if vocab is not None else get_vocab()
+        self.read(config_file)
+        self.pool = NamePool(load_config(config_file),load_forms(config_file))
+        for key,values in self.vocab.__dict__.items():
+            if key != 'forms':
+                self.add_forms(values,{form: lists[key] for form,lists in self.vocab.forms.items()})
 
-    # Read external config file and create new object attributes based on key/value pairs
+    # Read external config file (through the config cache) and create new object
+    # attributes based on key/value pairs
     def read(self,filename):
-        try:     
-           lines = open(resource_path(filename),'r',encoding='utf-8')         
-           for line in lines:                
-                if not line.startswith('#') and not line=='\n':  # Ignore comments and empty lines
-                    key,value = line.split('=')
-                    value = re.sub('\\[','',value)     # Anything between [] is interpreted as a list/array
-                    value = re.sub('\\]','',value)                
-                    setattr(self,key.strip(),value.strip().split(','))
-
-        except:
-            print(f'ERROR - {filename} did not finish loading')
+        forms = load_forms(filename)
+        for key,value in load_config(filename).items():
+            setattr(self,key,value)
+            self.add_forms(value,{form: lists[key] for form,lists in forms.items()})
 
-    # Returns a given/first name based on gender and language/group      
-    def get_given(self,gender='random',group='random'):
-        result = ''
-        name_group = group
-        if not group in self.name_groups:
-            name_group = choose(self.name_groups)
-        
-        name_type = gender        
-        match(name_type):
-            case 'male':
-                subcat = name_group+'MaleGiven'
-                result = choose(getattr(self,subcat))
-            case 'female':
-                subcat = name_group+'FemaleGiven'
-                result = choose(getattr(self,subcat))
-            case _:
-                sex = choose(['male','female'])
-                result = self.get_given(sex)
+    # Map each word in words to its precomputed forms (parallel lists, one per form)
+    def add_forms(self,words,folded):
+        for form,values in folded.items():
+            self.forms[form].update(zip(words,values))
+
+    # Returns a name or word in one of the FORMS. Config entries are looked up in the
+    # precomputed tables; anything else (eg. part of a name) is folded once and remembered
+    def fold(self,text,form='ascii'):
+        table = self.forms[form]
+        result = table.get(text)
+        if result is None:
+            result = table[text] = fold_text(text,form)
         return result
+
+    # Every get_* method draws from the generator's own rng unless another one is passed in
+
+    # Returns a given/first name based on gender and language/group      
+    def get_given(self,gender='random',group='random',rng=None):
+        rng = rng or self.rng
+        pool = self.pool
+        if gender not in ('male','female'):
+            gender = 'random'
+        return pool.table[pool.draw(rng,gender,pool.group_index.get(group))]
     
     # Returns a family name
-    def get_family(self,group='random'):
-        result = ''
-        name_group = group
-        if not group in self.name_groups:
-           name_group = choose(self.name_groups)
+    def get_family(self,group='random',rng=None):
+        rng = rng or self.rng
+        pool = self.pool
+        return pool.table[pool.draw(rng,'family',pool.group_index.get(group))]
 
-        family = name_group+"Family"
-        result = choose(getattr(self,family))
-        return result
+    # Returns a (given, family) name pair. The two come from the same group if group is 
+    # given or consistent (default: self.consistent_groups) is true, otherwise from any group
+    def get_names(self,gender='random',rng=None,group='random',consistent=None):
+        rng = rng or self.rng
+        pool = self.pool
+        if gender not in ('male','female'):
+            gender = 'random'
+        group_ind = pool.group_index.get(group)
+        if group_ind is None and (self.consistent_groups if consistent is None else consistent):
+            group_ind = rng.randrange(len(pool.groups))
+        return pool.table[pool.draw(rng,gender,group_ind)],pool.table[pool.draw(rng,'family',group_ind)]
 
     # Returns a full name (first and last)
-    def get_fullname(self,gender='random'):
-        name_group = choose(self.name_groups)
-        family_name = self.get_family()
-        first_name = self.get_given(gender,name_group)
-        result = first_name+" "+family_name
-        return result
+    def get_fullname(self,gender='random',rng=None,group='random',consistent=None):
+        given,family = self.get_names(gender,rng,group,consistent)
+        return given+" "+family
     
     # Returns a nickname (useful for generating email accounts, social media handles, etc)
-    def get_nickname(self,gender="random",name='random'):
+    # With form='ascii' or 'handle' every part of the nickname is taken in that form
+    def get_nickname(self,gender="random",name='random',rng=None,form=None):
+        rng = rng or self.rng
         result = ''
-        index = roll(14)
+        index = roll(14,rng)
         ADJECTIVES = self.vocab.adjectives
         NOUNS = self.vocab.nouns
         fullname = name
         if name == 'random':
-            fullname = nameGen.get_fullname()
+            fullname = self.get_fullname(rng=rng)
         names = fullname.split(' ')
+        if form is not None:
+            ADJECTIVES = self.vocab.forms[form]['adjectives']
+            NOUNS = self.vocab.forms[form]['nouns']
+            names = [self.fold(part,form) for part in names]
         given = names[0]
         family = names[1]
 
         match index:
-            case 1: 
-                result = choose(self.vocab.adjectives)+given
+            case 1:
+                result = choose(ADJECTIVES,rng)+given
             case 2:
-                result = given+str(roll(100))
+                result = given+str(roll(100,rng))
             case 3:
-                birthdate = fake_date('1930-01-01','2007-12-31')
-                birthyear,birthmonth,birthday = birthdate.split('-')
-                result = given+birthyear
+                result = given+str(rng.randint(1930,2007))      # birth year
             case 4:
-                result = fullname
-                result = re.sub(' ','_',result)
+                result = '_'.join(names)
             case 5:
-                result = given+str(roll(100))
+                result = given+str(roll(100,rng))
             case 6:
-                result = given+"_the_"+choose(NOUNS)
+                result = given+"_the_"+choose(NOUNS,rng)
             case 7:
-                result = given+'_'+choose(['likes','loves','saves','hearts','digs','eats','sells'])+'_'+make_plural(choose(NOUNS))
+                result = given+'_'+choose(['likes','loves','saves','hearts','digs','eats','sells'],rng)+'_'+make_plural(choose(NOUNS,rng))
             case 8:
-                result = "the_"+choose(ADJECTIVES)+"_"+given
+                result = "the_"+choose(ADJECTIVES,rng)+"_"+given
             case 9:
                 prefix = ['not','alt','fake','robot','your_favorite','dire','geeky']
-                result = choose(prefix)+given
+                result = choose(prefix,rng)+given
             case _:
-                result = given+family[0]+str(roll(100))
+                result = given+family[0]+str(roll(100,rng))
 
         return result
 
 ## ===================================================================================
-##       Create a NameGenerator instance to be called globally
+##       The NameGenerator shared by the fake_* functions. It is created on first use
+##       rather than at import; gen_dataset.nameGen still returns it
 ## ===================================================================================
-nameGen = NameGenerator()
+_name_generator = None
+
+def get_name_generator():
+    global _name_generator
+    if _name_generator is None:
+        _name_generator = NameGenerator()
+    return _name_generator
+
+def __getattr__(name):
+    if name == 'nameGen':
+        return get_name_generator()
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+## ===================================================================================
+##     TEMPLATES: Formats for messages, URLs, hashtags, domains and accounts, read from
+##     cfg_gen_templates.txt. Each template is compiled once into literal text and slots
+##     ({nouns|cap}, {[a,b]}, {family|ascii}, {domain}...) with their word lists folded
+##     up front, so a whole batch can be filled one slot at a time with numpy
+## ===================================================================================
+
+# Applies slot filters to a single word: a folded form (see FORMS), then the style -
+# 'cap' capitalizes the word and 'title' upper-cases the first letter of every word
+def format_word(word,form=None,style=None):
+    if form is not None:
+        word = fold_text(word,form)
+    match style:
+        case 'cap':
+            return word.capitalize()
+        case 'title':
+            return ' '.join(part[0:1].upper()+part[1:] for part in word.split(' '))
+    return word
+
+# Applies slot filters to an object array of words
+def format_words(words,form=None,style=None):
+    import numpy as np
+    if form is None and style is None:
+        return words
+    return np.array([format_word(word,form,style) for word in words],dtype=object)
+
+# {days}, {nouns|ascii}, {[a,b,c]} - a fixed word list, with its filters already applied
+class WordSlot:
+    def __init__(self,words):
+        import numpy as np
+        self.words = words
+        self.table = np.array(words,dtype=object)
+
+    def draw(self,rng):
+        return choose(self.words,rng)
+
+    def batch(self,num,nprng,rng):
+        return self.table[nprng.integers(0,len(self.words),size=num)]
+
+    # Number of distinct values the slot can produce (None if unknown)
+    def cardinality(self):
+        return len(set(self.words))
+
+# {1-9999} or {0000-9999} - a number in a range, zero-padded to the width of the lower
+# bound when that has leading zeros
+class RangeSlot:
+    def __init__(self,low,high):
+        self.low = int(low)
+        self.high = int(high)
+        self.width = len(low) if low.startswith('0') else 0
+
+    def draw(self,rng):
+        return str(rng.randint(self.low,self.high)).zfill(self.width)
+
+    def cardinality(self):
+        return self.high-self.low+1
+
+    def batch(self,num,nprng,rng):
+        import numpy as np
+        values = nprng.integers(self.low,self.high+1,size=num).astype(str)
+        if self.width:
+            values = np.char.zfill(values,self.width)
+        return values.astype(object)
+
+# {given} or {family} - a name from the name pool
+class NameSlot:
+    def __init__(self,kind,form=None,style=None):
+        self.kind = kind
+        self.form = form
+        self.style = style
+
+    def draw(self,rng):
+        name_gen = get_name_generator()
+        name = name_gen.get_given(rng=rng) if self.kind == 'given' else name_gen.get_family(rng=rng)
+        if self.form is not None:
+            name = name_gen.fold(name,self.form)
+        return format_word(name,style=self.style)
+
+    def batch(self,num,nprng,rng):
+        pool = get_name_generator().pool
+        names = pool.take(pool.draw_batch(nprng,num,'random' if self.kind == 'given' else 'family'),self.form)
+        return format_words(names,style=self.style)
+
+    def cardinality(self):
+        return get_name_generator().pool.distinct(self.kind)
+
+# {nickname} - NameGenerator.get_nickname, one call per value
+class NicknameSlot:
+    def __init__(self,form=None,style=None):
+        self.form = form
+        self.style = style
+
+    def draw(self,rng):
+        return format_word(get_name_generator().get_nickname(rng=rng,form=self.form),style=self.style)
+
+    def batch(self,num,nprng,rng):
+        import numpy as np
+        return np.array([self.draw(rng) for ind in range(num)],dtype=object)
+
+    def cardinality(self):
+        return None
+
+# {domain}, {account}... - the text of another template kind
+class KindSlot:
+    def __init__(self,templates,kind,form=None,style=None):
+        self.templates = templates
+        self.kind = kind
+        self.form = form
+        self.style = style
+
+    def draw(self,rng):
+        return format_word(self.templates.fill(self.kind,rng),self.form,self.style)
+
+    def batch(self,num,nprng,rng):
+        return format_words(self.templates.batch(self.kind,num,nprng,rng),self.form,self.style)
+
+    def cardinality(self):
+        return self.templates.cardinality(self.kind)
+
+# One compiled template: parts is a list of literal strings and slots
+class Template:
+    def __init__(self,text,parts,weight=1.0):
+        self.text = text
+        self.parts = parts
+        self.weight = weight
+
+    def fill(self,rng):
+        return ''.join(part if isinstance(part,str) else part.draw(rng) for part in self.parts)
+
+    # Fills num values at once: each slot draws num words and the parts are joined
+    # with numpy string addition on object arrays
+    def batch(self,num,nprng,rng):
+        import numpy as np
+        result = np.full(num,'',dtype=object)
+        for part in self.parts:
+            result = result+(part if isinstance(part,str) else part.batch(num,nprng,rng))
+        return result
+
+    # Upper bound on the number of distinct values (None if a slot is unbounded)
+    def cardinality(self):
+        total = 1
+        for part in self.parts:
+            if not isinstance(part,str):
+                count = part.cardinality()
+                if count is None:
+                    return None
+                total *= count
+        return total
+
+    def __repr__(self):
+        return f'Template({self.text!r},weight={self.weight})'
+
+class Templates:
+    def __init__(self,filename='cfg_gen_templates.txt',vocab=None):
+        self.filename = filename
+        self.vocab = vocab if vocab is not None else get_vocab()
+        self.lists = {}         # word lists defined in the templates file
+        self.sources = {}       # kind -> [(lineno,text,weight)]
+        self.kinds = {}         # kind -> [Template]
+        self.cum_weights = {}    # kind -> cumulative weights, as an array (batches) and a list (rows)
+        self.cum_lists = {}
+        self.read(filename)
+        self.compile()
+
+    # Reads word lists (name=[a,b,c]) and templates (kind=text or kind*weight=text)
+    def read(self,filename):
+        with open(resource_path(filename),'r',encoding='utf-8') as lines:
+            for lineno,line in enumerate(lines,1):
+                if line.startswith('#') or not line.strip():  # Ignore comments and empty lines
+                    continue
+                if '=' not in line:
+                    raise ValueError(f'{filename}:{lineno}: expected kind=template, got {line.strip()!r}')
+                key,value = line.split('=',1)
+                value = value.rstrip('\r\n')
+                if value.startswith('['):
+                    self.lists[key.strip()] = value.strip().strip('[]').split(',')
+                    continue
+                kind,sep,weight = key.partition('*')
+                try:
+                    weight = float(weight) if sep else 1.0
+                except ValueError:
+                    raise ValueError(f'{filename}:{lineno}: bad template weight {key!r}') from None
+                if not weight >= 0:
+                    raise ValueError(f'{filename}:{lineno}: template weights cannot be negative')
+                self.sources.setdefault(kind.strip(),[]).append((lineno,value,weight))
+
+    # Compiles every template into its slots and checks that kinds do not refer to themselves
+    def compile(self):
+        import numpy as np
+        for kind,sources in self.sources.items():
+            templates = []
+            for lineno,text,weight in sources:
+                try:
+                    templates.append(Template(text,self.compile_text(text),weight))
+                except ValueError as err:
+                    raise ValueError(f'{self.filename}:{lineno}: {kind}: {err}') from None
+            cum_weights = np.cumsum([template.weight for template in templates])
+            if cum_weights[-1] <= 0:
+                raise ValueError(f'{self.filename}: {kind}: no template has a positive weight')
+            self.kinds[kind] = templates
+            self.cum_weights[kind] = cum_weights
+            self.cum_lists[kind] = cum_weights.tolist()
+        for kind in self.kinds:
+            self.check_cycle(kind,())
+
+    def check_cycle(self,kind,path):
+        if kind in path:
+            raise ValueError(f'{self.filename}: template {kind!r} refers to itself ({" -> ".join(path+(kind,))})')
+        for template in self.kinds[kind]:
+            for part in template.parts:
+                if isinstance(part,KindSlot):
+                    self.check_cycle(part.kind,path+(kind,))
+
+    # Splits template text into literal strings and compiled slots
+    def compile_text(self,text):
+        parts = []
+        for ind,piece in enumerate(re.split(r'\{([^{}]*)\}',text)):
+            if ind%2 == 0:
+                if piece:
+                    parts.append(piece)
+            else:
+                parts.append(self.compile_slot(piece))
+        return parts
+
+    def compile_slot(self,slot):
+        source,*filters = [part.strip() for part in slot.split('|')]
+        form = None
+        style = None
+        for name in filters:
+            if name in FORMS:
+                form = name
+            elif name in ('cap','title'):
+                style = name
+            else:
+                raise ValueError(f'unknown filter {name!r} in {{{slot}}}')
+
+        if source.startswith('['):
+            return WordSlot([format_word(word,form,style) for word in source.strip('[]').split(',')])
+        match = re.fullmatch(r'(\d+)-(\d+)',source)
+        if match:
+            if int(match[1]) > int(match[2]):
+                raise ValueError(f'empty range {{{slot}}}')
+            return RangeSlot(match[1],match[2])
+        if source in self.lists:
+            return WordSlot([format_word(word,form,style) for word in self.lists[source]])
+        if source in ('given','family'):
+            return NameSlot(source,form,style)
+        if source == 'nickname':
+            return NicknameSlot(form,style)
+        if source in self.sources:
+            return KindSlot(self,source,form,style)
+        words = self.vocab.get(source)
+        if isinstance(words,list):
+            if form is not None:
+                words = self.vocab.forms[form][source]
+            return WordSlot([format_word(word,style=style) for word in words])
+        raise ValueError(f'unknown slot {{{slot}}}')
+
+    # Upper bound on the number of distinct values of a kind (None if unbounded)
+    def cardinality(self,kind):
+        counts = [template.cardinality() for template in self.kinds[kind] if template.weight > 0]
+        return None if None in counts else sum(counts)
+
+    # Picks a template of the given kind (in proportion to the weights) and fills it in
+    def fill(self,kind,rng=random):
+        templates = self.kinds[kind]
+        if len(templates) == 1:
+            return templates[0].fill(rng)
+        cum_weights = self.cum_lists[kind]
+        index = bisect.bisect_right(cum_weights,rng.random()*cum_weights[-1])
+        return templates[min(index,len(templates)-1)].fill(rng)
+
+    # Returns num values of the given kind as an object array, filling the rows of
+    # each template together
+    def batch(self,kind,num,nprng,rng=random):
+        import numpy as np
+        templates = self.kinds[kind]
+        if len(templates) == 1:
+            return templates[0].batch(num,nprng,rng)
+        cum_weights = self.cum_weights[kind]
+        picks = np.searchsorted(cum_weights,nprng.random(num)*cum_weights[-1],side='right')
+        result = np.empty(num,dtype=object)
+        for index,template in enumerate(templates):
+            rows = np.flatnonzero(picks == index)
+            if len(rows):
+                result[rows] = template.batch(len(rows),nprng,rng)
+        return result
+
+_templates = {}
+
+# Returns the Templates for filename, shared by every caller in the process
+def get_templates(filename='cfg_gen_templates.txt'):
+    if filename not in _templates:
+        _templates[filename] = Templates(filename)
+    return _templates[filename]
 
 ## ===================================================================================
 ##       Functions for generating numbers, text, emails, accounts, and more
@@ -215,250 +774,290 @@ nameGen = NameGenerator()
  
 # In order to create fake views or likes that reflect the possibility of virality,
 # fake numbers are defined with a 'min','max', and 'median' (most common value) - which then are used
-# by fake_num and fake_exp to create plausible counts.
+# by fake_num and fake_exp to create plausible counts. ?count columns use the fitted
+# distributions in COUNTS below; fake_num is kept as their 'legacy' shape.
 
-# Return a fake viral/high end result for a count
-def fake_exp(median,max):
+# Return a fake viral/high end result for a count, as an int
+def fake_exp(dmedian,dmax,rng=random):
     import math
 
     # Select a power that's between the natural log of the median and the natural log of the max
-    pow = random.randint(int(math.log(median)),int(math.log(max)))      
-    num = math.exp(pow)
+    power = rng.randint(int(math.log(dmedian)),int(math.log(dmax)))
+    num = int(math.exp(power))
 
     # Insurance - if num somehow ends up bigger than max, choose a number randomly between median and max
     # but without relying on explosive growth calculation
-    if num > max:
-        waffle = 200
-        if max-median < 200:
-            waffle = max-min
-        num = max-random.randint(1,waffle)
+    if num > dmax:
+        waffle = max(min(200,dmax-dmedian),1)
+        num = dmax-rng.randint(1,waffle)
     return num
 
-# Returns a number that falls within a range
-def fake_num(dmin=0,dmedian=50,dmax=35000,dsize=3000):
-    result = ''
-    test = random.randint(0,20)
+# Returns an int that falls within a range
+def fake_num(dmin=0,dmedian=50,dmax=35000,dsize=3000,rng=random):
+    test = rng.randint(0,20)
 
     # Bottom half of the results fall below the median
     if test < 10:
-        result = str(int(random.randint(0,dmedian)))
+        return rng.randint(dmin,dmedian)
     # Another set fall between the median and a calculated submax threshold
     elif test < 15:
-        submax = int(dmax/dmedian + (random.randint(0,dmedian-1)))
+        submax = int(dmax/dmedian + (rng.randint(0,dmedian-1)))
         if dmedian > submax:
             submax = dmax
-        result = str(int(random.randint(dmedian,submax)))
+        return rng.randint(dmedian,submax)
     # Another cluster falls within 2 deviations from the median
     elif test < 20:
         buffer = int((dmax-dmedian)*0.5)
-        new_max = buffer+dmedian
-        if new_max>dmax:
-            new_max = dmax
-        result = str(int(random.randint(dmedian,buffer+dmedian)))
+        return rng.randint(dmedian,buffer+dmedian)
     # At the top, fake explosive growth and virality with fake_exp
-    else:        
-        result = str(int(fake_exp(dmedian,dmax)))
-    return result
+    return fake_exp(dmedian,dmax,rng)
 
-# Returns a fake date as a string between two given dates in YYYY-MM-DD format
-def fake_date(start_date='2000-01-01',end_date='2024-12-31'):
-    import datetime as dt    
-    first_date = dt.date.fromisoformat(start_date)
-    last_date = dt.date.fromisoformat(end_date)
-    date_diff = last_date - first_date
-    offset = random.randint(0,date_diff.days)
-    new_date = first_date+dt.timedelta(offset)
-    return new_date.isoformat()
+# Vectorized fake_num: returns an int64 array of num counts drawn from the same
+# median/submax/fake_exp mixture, using the NumPy Generator nprng
+def fake_num_batch(nprng,num,dmin=0,dmedian=50,dmax=35000):
+    import math
+    import numpy as np
+    result = np.empty(num,dtype=np.int64)
+    test = nprng.integers(0,21,size=num)
 
-# Returns a properly formatted twitter/instagram account name (@username)
-def fake_account():
-    result=''
-    index=roll(10)    
-    ADJECTIVES = nameGen.vocab.adjectives
-    NOUNS = nameGen.vocab.nouns       
-    ACTORS =  nameGen.vocab.actors
+    # Bottom half of the results fall below the median
+    rows = test < 10
+    result[rows] = nprng.integers(dmin,dmedian+1,size=rows.sum())
 
-    match index:
-        case 1: 
-            result = choose(ADJECTIVES)+choose(['','_'])+choose(NOUNS)
-        case 2: 
-            result = choose(ADJECTIVES)+choose(['','_'])+choose(ACTORS)
-        case 3: 
-            result = choose(NOUNS)+choose(ACTORS)
-        case _: 
-            result = anyascii(nameGen.get_nickname())
-    result = re.sub(' ','_',result)
-    result = '@'+result.lower()
-    return result
+    # Between the median and a per-value submax threshold
+    rows = (test >= 10) & (test < 15)
+    submax = (dmax/dmedian + nprng.integers(0,dmedian,size=rows.sum())).astype(np.int64)
+    submax[submax < dmedian] = dmax
+    result[rows] = nprng.integers(dmedian,submax+1)
 
-# Returns a fake message string. This can be modified to suit the needs of the dataset
-def fake_sentence():
-    result = ''
-    index = roll(4)
-    DAYS = ['Monday','Tuesday','Wednesday','Thursday','Friday','Saturday','Sunday']
-    DAY_ADJS = ['terrible','horrible','terrific','brilliant','great','bad']
-  
-    ADJECTIVES = nameGen.vocab.adjectives
-    NOUNS = nameGen.vocab.nouns
-    PLACES = nameGen.vocab.places 
+    # Within 2 deviations from the median
+    rows = (test >= 15) & (test < 20)
+    result[rows] = nprng.integers(dmedian,int((dmax-dmedian)*0.5)+dmedian+1,size=rows.sum())
 
-    match index:
-        case 1: 
-            result = choose(NOUNS).capitalize()+" in "+choose(PLACES).capitalize()+". What a "+choose(DAY_ADJS)+" idea!"
-        case 2: 
-            result = "Another "+choose(DAYS)+". Another "+choose(ADJECTIVES)+" "+choose(NOUNS)
-        case 3: 
-            result = "Too close for comfort "+fake_account()
-        case 4:
-            result = fake_account()+" Have you seen this?!"
-        case _:
-            result = 'Check out the '+choose(NOUNS)+' in '+choose(PLACES)+'! '+fake_account()
-    
+    # Explosive growth (fake_exp), pulled back below max where the power overshoots
+    rows = test == 20
+    top = np.exp(nprng.integers(int(math.log(dmedian)),int(math.log(dmax))+1,size=rows.sum()))
+    over = top > dmax
+    waffle = max(min(200,dmax-dmedian),1)
+    top[over] = dmax-nprng.integers(1,waffle+1,size=over.sum())
+    result[rows] = top.astype(np.int64)
     return result
 
-# Returns a fake domain name. Useful for creating fake URLs and email addresses
-def fake_domain():
-    result = ''    
-    dotwhat = ['com','net','org']
-    dotorg = ['org','edu','gov']
+# Returns a fake date as a string between two given dates in YYYY-MM-DD format
+def fake_date(start_date='2000-01-01',end_date='2024-12-31',rng=random):
+    dates = get_date_range(start_date,end_date)
+    return dates.day_text(dates.draw_day(rng))
 
-    ADJECTIVES = nameGen.vocab.adjectives
-    NOUNS = nameGen.vocab.nouns
-    ACTORS = nameGen.vocab.actors
+# Returns a properly formatted twitter/instagram account name (@username)
+def fake_account(rng=random):
+    return get_templates().fill('account',rng)
 
-    index = roll(9)
-    match index:
-        case 1: 
-            result = choose(ADJECTIVES)+choose(NOUNS)+"."+choose(dotwhat)
-        case 2:
-            result = choose(ADJECTIVES)+choose(ACTORS)+"."+choose(dotwhat)
-        case 3:
-            result = nameGen.get_family()+"."+choose(dotwhat)
-        case 4:
-            result = nameGen.get_fullname().lower()+"."+choose(dotwhat)
-        case 5:
-            result = choose(NOUNS)+"."+choose(dotorg)
-        case 6:
-            result = nameGen.get_family()+"."+choose(dotorg)
-        case _:
-            result = choose(NOUNS)+"."+choose(dotwhat)
-    result = re.sub(' ','',result)
-    result = anyascii(result.lower())
-    return result
+# Returns a fake message string. The messages are templates in cfg_gen_templates.txt
+def fake_sentence(rng=random):
+    return get_templates().fill('sentence',rng)
+
+# Returns a fake domain name. Useful for creating fake URLs and email addresses
+def fake_domain(rng=random):
+    return get_templates().fill('domain',rng)
 
 # Returns a fake email address - relying on nickname and fake_domain. 
 # If a full name is passed in, it will use it as a potential seed for 
 # creating an email (the whole name or part of it)
-def fake_email(uname='random'):
-    index = roll(4)    
-    email_domains=['gmail.com','hotmail.com','aol.com','outlook.com','yahoo.com']
+EMAIL_DOMAINS = ['gmail.com','hotmail.com','aol.com','outlook.com','yahoo.com']
+
+def fake_email(uname='random',rng=random):
+    name_gen = get_name_generator()
+    index = roll(4,rng)
+    email_domains = EMAIL_DOMAINS
 
     match index:
         case 1:
-            domain = fake_domain()
+            domain = fake_domain(rng)
         case _:
-            domain = choose(email_domains)
+            domain = choose(email_domains,rng)
 
-    index = roll(4)
+    index = roll(4,rng)
     nickname = uname
     if uname == 'random':
-        nickname = nameGen.get_fullname()
+        nickname = name_gen.get_fullname(rng=rng)
     names = nickname.split(' ')        
     firstname = names[0]
     lastname = names[1]
 
     match index:
-        case 1: 
-            nickname = firstname+"."+lastname
+        case 1:
+            nickname = name_gen.fold(firstname)+"."+name_gen.fold(lastname)
         case 2:
-            nickname = firstname+lastname[0]
+            nickname = name_gen.fold(firstname)+name_gen.fold(lastname[0])
         case _:
-            nickname = nameGen.get_nickname(name=nickname)    
-    nickname = str(anyascii(nickname))    
-    result = nickname.lower()+"@"+domain
-    result = re.sub(' ','',result)
+            nickname = name_gen.get_nickname(name=nickname,rng=rng,form='ascii')
+    result = nickname+"@"+domain
     return result
 
 # Returns a fake hashtag with a # prefix
-def fake_hashtag():
-    result = '#'
-    index = roll(4)
-    NOUNS = nameGen.vocab.nouns
-    ACTORS = nameGen.vocab.actors
-    PLACES = nameGen.vocab.places 
-    ADJECTIVES = nameGen.vocab.adjectives
-    match index:
-        case 1: 
-            result = choose(ADJECTIVES)+choose(NOUNS)
-        case 2:
-            result = choose(ADJECTIVES)+choose(ACTORS)
-        case 3:
-            result = choose(PLACES)
-        case 4:
-            result = choose(ADJECTIVES)+choose(PLACES)
-        case 5:
-            result = choose(ADJECTIVES)+nameGen.get_family()
-        case 6:
-            result = choose(ADJECTIVES)+choose(['times','accidents','people','fates','cats','films','books'])
-        case _:
-            result = choose(NOUNS)
-    result = "#"+re.sub(' ','',result)
-    return result
+def fake_hashtag(rng=random):
+    return get_templates().fill('hashtag',rng)
 
 # Returns a fake website URL (possibly with subpage)
-def fake_url():
-    result = 'www.'+fake_domain()
-    index = roll(7)
-    NOUNS = nameGen.vocab.nouns
-    PLACES = nameGen.vocab.places 
-
-    match index:
-        case 1: 
-            result = result + '/'+choose(NOUNS)+'/'+choose(NOUNS)+'.html'
-        case 2:
-            result = result + '/'+choose(PLACES)+'.html'
-        case 3:
-            result = result + '/'+choose(nameGen.vocab.adjectives)+choose(NOUNS)+'.html'
-        case _:
-            result = result
-    result = re.sub(' ','',result)
-    return result
+def fake_url(rng=random):
+    return get_templates().fill('url',rng)
 
 # Returns a full name, given/first name, family/last name, nickname, or reversed name format
-def fake_name(kind='full'):
-    result = nameGen.get_fullname()
+def fake_name(kind='full',rng=random):
+    name_gen = get_name_generator()
+    result = name_gen.get_fullname(rng=rng)
     match kind:
         case 'full_rev':
-            result = nameGen.get_family()+', '+nameGen.get_given()
+            result = name_gen.get_family(rng=rng)+', '+name_gen.get_given(rng=rng)
         case 'first':
-            result = nameGen.get_given()
+            result = name_gen.get_given(rng=rng)
         case 'last':
-            result = nameGen.get_family()
+            result = name_gen.get_family(rng=rng)
         case 'nick':
-            result = nameGen.get_nickname()
+            result = name_gen.get_nickname(rng=rng)
         case _:
-            result = nameGen.get_fullname()
+            result = name_gen.get_fullname(rng=rng)
     return result
 
 
+## ===================================================================================
+##     COUNTS: heavy-tailed integer distributions for ?count(min,median,max,shape).
+##     Each shape is fitted to the min, median and max once, when the column is
+##     compiled, and then sampled in NumPy batches (or one value at a time with rng):
+##       lognormal - the median in the middle and max at the 99.99th percentile
+##       pareto    - a power law tail fitted to the median, cut off at max
+##       zipf      - discrete power law over min..max fitted to the median
+##       legacy    - the original fake_num mixture, clipped to min..max
+## ===================================================================================
+
+COUNT_SHAPES = ('lognormal','pareto','zipf','legacy')
+COUNT_TAIL_Z = 3.719            # standard normal quantile of the lognormal max (99.99%)
+ZIPF_TABLE_MAX = 10**6          # zipf keeps one cumulative weight per possible value
+
+# Finds where the increasing function func crosses zero in [lo,hi] by bisection, and
+# returns the end of the final interval where func >= 0
+def fit_root(func,lo,hi,steps=60):
+    for ind in range(steps):
+        mid = (lo+hi)/2
+        if func(mid) < 0:
+            lo = mid
+        else:
+            hi = mid
+    return hi
+
+# Continuous shapes draw y from [1,top) with median vmedian-vmin+1.5 and return
+# vmin-1+floor(y), so the counts land on min..max with the requested median
+class CountDistribution:
+    def __init__(self,vmin,vmedian,vmax,shape='lognormal'):
+        import math
+        import numpy as np
+        if shape not in COUNT_SHAPES:
+            raise ValueError(f'unknown count shape {shape!r} - use {", ".join(COUNT_SHAPES)}')
+        self.vmin = vmin
+        self.vmedian = vmedian
+        self.vmax = vmax
+        self.shape = shape
+        self.top = vmax-vmin+2
+        target = vmedian-vmin+1.5
+        match shape:
+            case 'lognormal':
+                self.mu = math.log(target)
+                self.sigma = max(math.log(self.top/target)/COUNT_TAIL_Z,1e-9)
+            case 'pareto':
+                # Truncated Pareto on [1,top): cdf(y) = (1-y**-a)/(1-top**-a)
+                def excess(alpha):
+                    if abs(alpha) < 1e-9:
+                        return math.log(target)/math.log(self.top)-0.5
+                    return (1-target**-alpha)/(1-self.top**-alpha)-0.5
+                self.alpha = fit_root(excess,-10.0,50.0)
+                if abs(self.alpha) < 1e-9:
+                    self.alpha = 1e-9
+                self.scale = 1-self.top**-self.alpha
+            case 'zipf':
+                size = vmax-vmin+1
+                if size > ZIPF_TABLE_MAX:
+                    raise ValueError(f'zipf counts are limited to {ZIPF_TABLE_MAX} values - use lognormal or pareto')
+                ranks = np.arange(1,size+1,dtype=float)
+                # Puts the median a quarter of the way into the median value's share
+                # (half way would need all the weight on min when median == min)
+                median = vmedian-vmin+1
+                def excess(power):
+                    weights = ranks**-power
+                    return (weights[:median].sum()-weights[median-1]/4)/weights.sum()-0.5
+                self.power = fit_root(excess,-10.0,50.0)
+                self.cum = np.cumsum(ranks**-self.power)
+            case 'legacy':
+                if vmedian < 1:
+                    raise ValueError('legacy counts need median >= 1')
+
+    # One count as an int, drawn with a random.Random
+    def draw(self,rng=random):
+        match self.shape:
+            case 'lognormal':
+                y = self.top
+                while y >= self.top:
+                    y = rng.lognormvariate(self.mu,self.sigma)
+                return self.vmin-1+max(int(y),1)
+            case 'pareto':
+                y = (1-rng.random()*self.scale)**(-1/self.alpha)
+                return self.vmin-1+min(int(y),self.top-1)
+            case 'zipf':
+                rank = bisect.bisect_right(self.cum,rng.random()*self.cum[-1])
+                return self.vmin+min(rank,len(self.cum)-1)
+        return min(max(fake_num(self.vmin,self.vmedian,self.vmax,rng=rng),self.vmin),self.vmax)
+
+    # num counts as an int64 array, drawn with a NumPy Generator
+    def sample(self,nprng,num):
+        import numpy as np
+        match self.shape:
+            case 'lognormal':
+                y = nprng.lognormal(self.mu,self.sigma,num)
+                over = y >= self.top
+                while over.any():                   # about 1 in 10000 values
+                    y[over] = nprng.lognormal(self.mu,self.sigma,over.sum())
+                    over = y >= self.top
+                return self.vmin-1+np.maximum(y,1).astype(np.int64)
+            case 'pareto':
+                y = (1-nprng.random(num)*self.scale)**(-1/self.alpha)
+                return self.vmin-1+np.minimum(y.astype(np.int64),self.top-1)
+            case 'zipf':
+                ranks = np.searchsorted(self.cum,nprng.random(num)*self.cum[-1],side='right')
+                return self.vmin+np.minimum(ranks,len(self.cum)-1)
+        return np.clip(fake_num_batch(nprng,num,self.vmin,self.vmedian,self.vmax),self.vmin,self.vmax)
+
+    def __repr__(self):
+        return f'{type(self).__name__}({self.vmin},{self.vmedian},{self.vmax},{self.shape!r})'
+
 ## ===================================================================================
 ##     FAKEUSER: Used to create internally consistent names, email addresses, 
 ##     and account names.
 ## ===================================================================================
  
+USER_FIELDS = ('name','given','family','rev_name','email','handle')
+
 class FakeUser:
-    def __init__(self):
-        self.generate()
+    # fields limits the expensive fields (email, handle) to the ones that are needed;
+    # the others are left as None. By default everything is generated
+    def __init__(self,rng=random,fields=None):
+        self.generate(rng,fields)
     
     # Generate names, email, and nickname
-    def generate(self):
-        self.name = fake_name('full')
-        namelist = self.name.split(' ')
-        self.given = namelist[0]
-        self.family = namelist[1]
+    def generate(self,rng=random,fields=None):
+        name_gen = get_name_generator()
+        self.given,self.family = name_gen.get_names(rng=rng)
+        self.name = self.given+' '+self.family
         self.rev_name = self.family+', '+self.given
-        self.email = fake_email(uname=self.name)
-        self.handle = nameGen.get_nickname(name=self.name)
+        self.email = None
+        self.handle = None
+        if fields is None or 'email' in fields:
+            self.email = fake_email(uname=self.name,rng=rng)
+        if fields is None or 'handle' in fields:
+            self.handle = name_gen.get_nickname(name=self.name,rng=rng)
+
+    # Generate num users at once, stored column-wise (see FakeUserBatch)
+    @staticmethod
+    def generate_many(num,nprng=None,rng=random):
+        return FakeUserBatch(num,nprng,rng)
 
     # Dump info 
     def dump(self):
@@ -469,103 +1068,2159 @@ class FakeUser:
     def print(self):
         print(self.dump())
 
+## ===================================================================================
+##     FAKEUSERBATCH: num users stored column-wise, with one object array per field
+##     (given, family, name, rev_name, email, handle). Names are drawn in bulk from the 
+##     name pool; every other field is only built the first time it is accessed, so a
+##     schema that only uses names never pays for emails or handles
+## ===================================================================================
+
+class FakeUserBatch:
+    def __init__(self,num,nprng=None,rng=random):
+        import numpy as np
+        name_gen = get_name_generator()
+        pool = name_gen.pool
+        self.num = num
+        self.nprng = nprng if nprng is not None else np.random.default_rng()
+        self.rng = rng
+        groups = pool.draw_groups(self.nprng,num) if name_gen.consistent_groups else None
+        self.given_ids = pool.draw_batch(self.nprng,num,'random',groups)
+        self.family_ids = pool.draw_batch(self.nprng,num,'family',groups)
+
+    def __len__(self):
+        return self.num
+
+    # Fields are built on first access and then stored as ordinary attributes
+    def __getattr__(self,field):
+        if field not in USER_FIELDS:
+            raise AttributeError(f'{type(self).__name__!r} object has no attribute {field!r}')
+        value = self.build(field)
+        setattr(self,field,value)
+        return value
+
+    def build(self,field):
+        import numpy as np
+        name_gen = get_name_generator()
+        rng = self.rng
+        match field:
+            case 'given':
+                return name_gen.pool.take(self.given_ids)
+            case 'family':
+                return name_gen.pool.take(self.family_ids)
+            case 'name':
+                return self.given+' '+self.family
+            case 'rev_name':
+                return self.family+', '+self.given
+            case 'email':
+                return self.build_emails()
+            case 'handle':
+                return np.array([name_gen.get_nickname(name=name,rng=rng) for name in self.name],dtype=object)
+
+    # Same choices as fake_email: 1 in 4 addresses use a fake_domain, and the account
+    # is first.last, first+initial or (half the time) an ASCII nickname
+    def build_emails(self):
+        import numpy as np
+        name_gen = get_name_generator()
+        pool = name_gen.pool
+        nprng,rng,num = self.nprng,self.rng,self.num
+
+        domains = np.array(EMAIL_DOMAINS,dtype=object)[nprng.integers(0,len(EMAIL_DOMAINS),size=num)]
+        rows = nprng.integers(0,4,size=num) == 0
+        domains[rows] = get_templates().batch('domain',rows.sum(),nprng,rng)
+
+        style = nprng.integers(0,4,size=num)
+        given = pool.take(self.given_ids,'ascii')
+        accounts = np.empty(num,dtype=object)
+        rows = style == 0
+        accounts[rows] = given[rows]+'.'+pool.take(self.family_ids[rows],'ascii')
+        rows = style == 1
+        accounts[rows] = given[rows]+pool.take(self.family_ids[rows],'initial')
+        rows = style >= 2
+        accounts[rows] = [name_gen.get_nickname(name=name,rng=rng,form='ascii') for name in self.name[rows]]
+        return accounts+'@'+domains
+
+## ===================================================================================
+##     IDENTIFIERS: fixed-width digit strings, ISSNs and ISBN-13s. The batch versions 
+##     draw every digit of every value as one uint8 array, compute the check digits with
+##     numpy arithmetic and turn the rows of bytes straight into strings
+## ===================================================================================
+
+ISSN_WEIGHTS = (8,7,6,5,4,3,2)
+ISBN_PREFIX = '978'
+
+# Turns a (num,width) uint8 array of ASCII codes into an object array of strings
+def bytes_to_strings(codes):
+    import numpy as np
+    width = codes.shape[1]
+    return np.ascontiguousarray(codes).view(f'S{width}').ravel().astype(f'U{width}').astype(object)
+
+# Returns a string of num random digits (eg. fake_fixedint(6) --> '001318')
+def fake_fixedint(num=6,rng=random):
+    return ''.join(str(rng.randrange(10)) for ind in range(num))
+
+def fixedint_batch(nprng,num,digits=6):
+    import numpy as np
+    return bytes_to_strings(nprng.integers(0,10,size=(num,digits),dtype=np.uint8)+ord('0'))
+
+# ISSN check digit for 7 digits: 0-9 or X
+def issn_check(digits):
+    check = (11-sum(digit*weight for digit,weight in zip(digits,ISSN_WEIGHTS))%11)%11
+    return 'X' if check == 10 else str(check)
+
+# ISBN-13 check digit for 12 digits
+def isbn_check(digits):
+    return str((10-sum(digit*(3 if ind%2 else 1) for ind,digit in enumerate(digits))%10)%10)
+
+# Returns a valid ISSN (eg. 0317-8471)
+def fake_issn(rng=random):
+    digits = [rng.randrange(10) for ind in range(7)]
+    text = ''.join(str(digit) for digit in digits)
+    return text[0:4]+'-'+text[4:]+issn_check(digits)
+
+def issn_batch(nprng,num):
+    import numpy as np
+    digits = nprng.integers(0,10,size=(num,7),dtype=np.uint8)
+    check = (11-(digits.astype(np.int64)@np.array(ISSN_WEIGHTS))%11)%11
+    codes = np.empty((num,9),dtype=np.uint8)
+    codes[:,0:4] = digits[:,0:4]+ord('0')
+    codes[:,4] = ord('-')
+    codes[:,5:8] = digits[:,4:7]+ord('0')
+    codes[:,8] = np.frombuffer(b'0123456789X',dtype=np.uint8)[check]
+    return bytes_to_strings(codes)
+
+# Returns a valid ISBN-13 (eg. 9780306406157)
+def fake_isbn(rng=random):
+    digits = [int(digit) for digit in ISBN_PREFIX]+[rng.randrange(10) for ind in range(12-len(ISBN_PREFIX))]
+    return ''.join(str(digit) for digit in digits)+isbn_check(digits)
+
+def isbn_batch(nprng,num):
+    import numpy as np
+    digits = np.empty((num,13),dtype=np.uint8)
+    digits[:,0:3] = np.frombuffer(ISBN_PREFIX.encode(),dtype=np.uint8)-ord('0')
+    digits[:,3:12] = nprng.integers(0,10,size=(num,9),dtype=np.uint8)
+    weights = np.tile([1,3],6)
+    digits[:,12] = (10-(digits[:,0:12].astype(np.int64)@weights)%10)%10
+    return bytes_to_strings(digits+ord('0'))
+
+# Returns an ISSN or an ISBN, with even odds
+def fake_isxn(rng=random):
+    return fake_issn(rng) if rng.random() < 0.5 else fake_isbn(rng)
+
+def isxn_batch(nprng,num):
+    import numpy as np
+    result = isbn_batch(nprng,num)
+    rows = np.flatnonzero(nprng.random(num) < 0.5)
+    result[rows] = issn_batch(nprng,len(rows))
+    return result
+
+## ===================================================================================
+##     CALENDAR: date ranges for ?date, ?datetime and ?timestamp columns and fake_date.
+##     A DateRange is built once per column; batches are drawn as day and second offsets
+##     from its first day and come out as datetime64 arrays, and ISO text is only made
+##     (in bulk, by date_strings) for text output. Days can be weighted towards
+##     weekdays and times of day towards business hours
+## ===================================================================================
+
+WEEKEND_WEIGHT = 0.4            # a weekend day is 40% as likely as a weekday
+BUSINESS_HOURS = (0.2,0.1,0.1,0.1,0.1,0.2,0.5,1,2,3,3,3,3,3,3,3,3,2,1.5,1.2,1,0.8,0.5,0.3)
+DATE_TEXT_MAX = 200000          # longest range (in days) whose ISO strings are kept
+
+class DateRange:
+    def __init__(self,start,end,weekdays=False,business=False):
+        import numpy as np
+        self.start = start
+        self.days = end.toordinal()-start.toordinal()+1
+        self.base = np.datetime64(start,'D')
+        self.day_cum = None
+        self.hour_cum = None
+        self.texts = None
+        if weekdays:
+            weekday = (np.arange(self.days)+start.weekday())%7
+            self.day_cum = np.cumsum(np.where(weekday < 5,1.0,WEEKEND_WEIGHT))
+        if business:
+            self.hour_cum = np.cumsum(BUSINESS_HOURS)
+
+    # YYYY-MM-DD of a day (0 is the start date), from a table made on first use
+    def day_text(self,day):
+        if self.days > DATE_TEXT_MAX:
+            import datetime as dt
+            return dt.date.fromordinal(self.start.toordinal()+day).isoformat()
+        if self.texts is None:
+            import numpy as np
+            self.texts = np.datetime_as_string(self.base+np.arange(self.days),unit='D').tolist()
+        return self.texts[day]
+
+    # One day, drawn with a random.Random
+    def draw_day(self,rng):
+        if self.day_cum is None:
+            return rng.randint(0,self.days-1)
+        return min(bisect.bisect_right(self.day_cum,rng.random()*self.day_cum[-1]),self.days-1)
+
+    # One second of the day, drawn with a random.Random
+    def draw_second(self,rng):
+        if self.hour_cum is None:
+            return rng.randint(0,86399)
+        hour = min(bisect.bisect_right(self.hour_cum,rng.random()*self.hour_cum[-1]),23)
+        return hour*3600+rng.randint(0,3599)
+
+    # num days as an int array, drawn with a NumPy Generator
+    def draw_days(self,nprng,num):
+        import numpy as np
+        if self.day_cum is None:
+            return nprng.integers(0,self.days,size=num)
+        days = np.searchsorted(self.day_cum,nprng.random(num)*self.day_cum[-1],side='right')
+        return np.minimum(days,self.days-1)
+
+    # num seconds of the day as an int array
+    def draw_seconds(self,nprng,num):
+        import numpy as np
+        if self.hour_cum is None:
+            return nprng.integers(0,86400,size=num)
+        hours = np.minimum(np.searchsorted(self.hour_cum,nprng.random(num)*self.hour_cum[-1],side='right'),23)
+        return hours*3600+nprng.integers(0,3600,size=num)
+
+    # num dates as datetime64[D]
+    def sample_dates(self,nprng,num):
+        return self.base+self.draw_days(nprng,num)
+
+    # num local date-times as datetime64[s]
+    def sample_times(self,nprng,num):
+        days = self.draw_days(nprng,num)
+        return self.base.astype('datetime64[s]')+(days*86400+self.draw_seconds(nprng,num))
+
+_date_ranges = {}
+
+# DateRange for a pair of YYYY-MM-DD strings, parsed once per pair
+def get_date_range(start_date,end_date):
+    key = (start_date,end_date)
+    if key not in _date_ranges:
+        import datetime as dt
+        _date_ranges[key] = DateRange(dt.date.fromisoformat(start_date),dt.date.fromisoformat(end_date))
+    return _date_ranges[key]
+
+# '+HH:MM' for a UTC offset in seconds
+def format_offset(seconds):
+    sign = '-' if seconds < 0 else '+'
+    minutes = abs(int(seconds))//60
+    return f'{sign}{minutes//60:02d}:{minutes%60:02d}'
+
+_time_texts = None
+
+# ' HH:MM:SS' for every second of the day, as an object array made on first use
+def time_texts():
+    global _time_texts
+    if _time_texts is None:
+        import numpy as np
+        _time_texts = np.array([f' {second//3600:02d}:{second//60%60:02d}:{second%60:02d}' for second in range(86400)],dtype=object)
+    return _time_texts
+
+# Object array of ISO text for a datetime64 array (YYYY-MM-DD for days, else
+# YYYY-MM-DD HH:MM:SS) or a time zone aware pandas array (with a +HH:MM offset, as
+# pandas writes them to CSV). Days and times are looked up in tables rather than
+# formatted one value at a time
+def date_strings(values):
+    import numpy as np
+    if hasattr(values,'tz'):
+        local = np.asarray(values.tz_localize(None),dtype='datetime64[s]')
+        utc = np.asarray(values.tz_convert('UTC').tz_localize(None),dtype='datetime64[s]')
+        offsets,inverse = np.unique((local-utc).astype(np.int64),return_inverse=True)
+        suffixes = np.array([format_offset(offset) for offset in offsets],dtype=object)
+        return date_strings(local)+suffixes[inverse.reshape(-1)]
+    days = values.astype('datetime64[D]')
+    first = days.min() if days.size else None
+    if first is not None and not np.isnat(first) and (days.max()-first).astype(np.int64) < DATE_TEXT_MAX:
+        table = np.datetime_as_string(first+np.arange((days.max()-first).astype(np.int64)+1),unit='D').astype(object)
+        text = table[(days-first).astype(np.int64)]
+    else:
+        text = np.datetime_as_string(days,unit='D').astype(object)
+    if np.datetime_data(values.dtype)[0] == 'D':
+        return text
+    return text+time_texts()[(values.astype('datetime64[s]')-days).astype(np.int64)]
+
+## ===================================================================================
+##   COMPILED SCHEMA: Each entry of cfg_gen_dataset.txt is parsed and validated once,
+##   when the config is loaded, into a column object with its parameters ready to use.
+##   Generating a row then only has to call value() on each column.
+## ===================================================================================
+
+# Base column - plain text entries are repeated as-is on every row
+class Column:
+    fields = ()           # FakeUser fields the column reads
+    kind = 'text'         # column type, as reported by DatasetStats
+
+    def __init__(self,spec):
+        self.spec = spec
+
+    # Returns the value for the current row of the given DatasetGenerator
+    def value(self,dataset):
+        return self.spec
+
+    # Returns num values at once as an array (or list) for columnar generation
+    def batch(self,dataset,num):
+        import numpy as np
+        return np.full(num,self.spec,dtype=object)
+
+    # Upper bound on the number of distinct values, or None if unknown or very large.
+    # Used to refuse !unique columns that cannot have enough distinct values
+    def cardinality(self):
+        return 1
+
+    # Draws the column shares with other columns of its row: 'user' for the row's FakeUser
+    # and (table,skew) for the referenced row of ?ref columns. A !unique column that
+    # redraws a row redraws every column sharing one of its draws with it
+    def shared(self):
+        return {'user'} if self.fields else set()
+
+    def __repr__(self):
+        return f'{type(self).__name__}({self.spec!r})'
+
+# Splits a list item into (value,weight) - 'twitter*5' gives ('twitter',5.0) and items
+# without a numeric *weight suffix have weight 1
+def split_weight(item):
+    value,sep,weight = item.rpartition('*')
+    if not sep:
+        return item,1.0
+    try:
+        weight = float(weight)
+    except ValueError:
+        return item,1.0
+    if not weight >= 0:
+        raise ValueError(f'{item!r} has a negative weight')
+    return value,weight
+
+# List entries ([a,b,c]) pick one of their items for each row. Items can be weighted 
+# as value*weight (eg. [twitter*5,instagram*2,telegram]). Batches are pd.Categorical:
+# small integer codes into one category table shared by every chunk
+class ListColumn(Column):
+    kind = 'list'
+
+    def __init__(self,spec,items):
+        import itertools
+        import numpy as np
+        super().__init__(spec)
+        pairs = [split_weight(item) for item in items]
+        self.items = [value for value,weight in pairs]
+        self.categories = list(dict.fromkeys(self.items))
+        index = {value: code for code,value in enumerate(self.categories)}
+        self.codes = np.array([index[value] for value in self.items],dtype=np.min_scalar_type(len(self.categories)))
+        self.cum_weights = None
+        if any(weight != 1.0 for value,weight in pairs):
+            self.cum_weights = list(itertools.accumulate(weight for value,weight in pairs))
+            if self.cum_weights[-1] <= 0:
+                raise ValueError(f'{spec!r} has no item with a positive weight')
+            self.cum_array = np.array(self.cum_weights)
+
+    def value(self,dataset):
+        if self.cum_weights is None:
+            return choose(self.items,dataset.rng)
+        return dataset.rng.choices(self.items,cum_weights=self.cum_weights)[0]
+
+    def batch(self,dataset,num):
+        import numpy as np
+        import pandas as pd
+        nprng = dataset.nprng
+        if self.cum_weights is None:
+            picks = nprng.integers(0,len(self.items),size=num)
+        else:
+            picks = np.searchsorted(self.cum_array,nprng.random(num)*self.cum_array[-1],side='right')
+        return pd.Categorical.from_codes(self.codes[picks],categories=self.categories)
+
+    def cardinality(self):
+        return len(self.categories)
+
+# Generated entries that are filled from a template kind (?sentence, ?url, ?hashtag,
+# or any other kind in cfg_gen_templates.txt)
+class TemplateColumn(Column):
+    def __init__(self,spec,template):
+        super().__init__(spec)
+        self.template = template
+
+    def value(self,dataset):
+        return get_templates().fill(self.template,dataset.rng)
+
+    def batch(self,dataset,num):
+        return get_templates().batch(self.template,num,dataset.nprng,dataset.rng)
+
+    def cardinality(self):
+        return get_templates().cardinality(self.template)
+
+# ?int(min,max) - uniformly distributed integers, both bounds included
+class RangeColumn(Column):
+    def __init__(self,spec,vmin,vmax):
+        super().__init__(spec)
+        self.vmin = vmin
+        self.vmax = vmax
+
+    def value(self,dataset):
+        return dataset.rng.randint(self.vmin,self.vmax)
+
+    def batch(self,dataset,num):
+        return dataset.nprng.integers(self.vmin,self.vmax+1,size=num)
+
+    def cardinality(self):
+        return self.vmax-self.vmin+1
+
+# Generated entries with a row function func(rng) and a batch function batch_func(nprng,num)
+# (?fixedint, ?issn, ?isbn, ?isxn). Both are module-level functions or partials of them,
+# so the column can be sent to worker processes. count is the number of possible values
+class GeneratorColumn(Column):
+    def __init__(self,spec,func,batch_func,count=None):
+        super().__init__(spec)
+        self.func = func
+        self.batch_func = batch_func
+        self.count = count
+
+    def value(self,dataset):
+        return self.func(rng=dataset.rng)
+
+    def batch(self,dataset,num):
+        return self.batch_func(dataset.nprng,num)
+
+    def cardinality(self):
+        return self.count
+
+# Entries made of several parts joined together, eg. ?char(A-Z)+int(1000,2000)+-+fixedint(6).
+# Each part is a column (literal text parts are plain Columns), and batches are joined 
+# as object arrays of strings
+class ComposedColumn(Column):
+    def __init__(self,spec,parts):
+        super().__init__(spec)
+        self.parts = parts
+        self.fields = tuple(field for part in parts for field in part.fields)
+
+    def value(self,dataset):
+        return ''.join(str(part.value(dataset)) for part in self.parts)
+
+    def batch(self,dataset,num):
+        import numpy as np
+        result = np.full(num,'',dtype=object)
+        for part in self.parts:
+            result = result+text_array(part.batch(dataset,num))
+        return result
+
+    def cardinality(self):
+        total = 1
+        for part in self.parts:
+            count = part.cardinality()
+            if count is None:
+                return None
+            total *= count
+        return total
+
+    def shared(self):
+        return set().union(*(part.shared() for part in self.parts))
+
+    def __repr__(self):
+        return f'{type(self).__name__}({self.spec!r},{self.parts!r})'
+
+# Converts a column batch (array, list or pd.Categorical) into an object array of strings
+def text_array(values):
+    import numpy as np
+    if hasattr(values,'tz') or isinstance(values,np.ndarray) and values.dtype.kind == 'M':
+        return date_strings(values)
+    if isinstance(values,np.ndarray):
+        if values.dtype != object:
+            return values.astype(str).astype(object)
+    return np.asarray(values,dtype=object)
+
+# ?count(min,median,max,shape) - plausible counts (views, likes) from a CountDistribution
+class IntColumn(Column):
+    def __init__(self,spec,vmin,vmedian,vmax,shape='lognormal'):
+        super().__init__(spec)
+        self.vmin = vmin
+        self.vmedian = vmedian
+        self.vmax = vmax
+        self.dist = CountDistribution(vmin,vmedian,vmax,shape)
+
+    def value(self,dataset):
+        return self.dist.draw(dataset.rng)
+
+    def batch(self,dataset,num):
+        return self.dist.sample(dataset.nprng,num)
+
+    def cardinality(self):
+        return self.vmax-self.vmin+1
+
+# ?date(start,end), ?datetime(start,end) and ?timestamp(start,end,tz) from a DateRange.
+# Batches are datetime64[D] (unit 'D'), datetime64[s] local times (unit 's') or, with
+# a tz, time zone aware pandas arrays. Local times that the clocks skip are moved
+# forward, and repeated ones are read as standard time
+class DateColumn(Column):
+    def __init__(self,spec,dates,unit='D',tz=None):
+        super().__init__(spec)
+        self.dates = dates
+        self.unit = unit
+        self.tz = tz
+
+    def value(self,dataset):
+        rng = dataset.rng
+        text = self.dates.day_text(self.dates.draw_day(rng))
+        if self.unit == 'D':
+            return text
+        second = self.dates.draw_second(rng)
+        text = f'{text} {second//3600:02d}:{second//60%60:02d}:{second%60:02d}'
+        if self.tz is None:
+            return text
+        import pandas as pd
+        return str(pd.Timestamp(text).tz_localize(self.tz,ambiguous=False,nonexistent='shift_forward'))
+
+    def batch(self,dataset,num):
+        if self.unit == 'D':
+            return self.dates.sample_dates(dataset.nprng,num)
+        values = self.dates.sample_times(dataset.nprng,num)
+        if self.tz is None:
+            return values
+        import numpy as np
+        import pandas as pd
+        return pd.DatetimeIndex(values).tz_localize(self.tz,ambiguous=np.zeros(num,dtype=bool),
+                                                    nonexistent='shift_forward').array
+
+    def cardinality(self):
+        return self.dates.days if self.unit == 'D' else self.dates.days*86400
+
+# Entries taken from the row's FakeUser so that name and email stay consistent
+class UserColumn(Column):
+    def __init__(self,spec,field):
+        super().__init__(spec)
+        self.field = field
+        self.fields = (field,)
+
+    def value(self,dataset):
+        return getattr(dataset.user,self.field)
+
+    def batch(self,dataset,num):
+        return getattr(dataset.users,self.field)
+
+    # Names are limited by the name lists - emails and handles are effectively unbounded
+    def cardinality(self):
+        pool = get_name_generator().pool
+        match self.field:
+            case 'given' | 'family':
+                return pool.distinct(self.field)
+            case 'name' | 'rev_name':
+                return pool.distinct('given')*pool.distinct('family')
+        return None
+
+# ?id - the row number counted from 1, carried across chunks and shards
+class IdColumn(Column):
+    def value(self,dataset):
+        return dataset.row+1
+
+    def batch(self,dataset,num):
+        import numpy as np
+        return np.arange(dataset.row+1,dataset.row+num+1)
+
+    def cardinality(self):
+        return None
+
+# ?ref(table) or ?ref(table.field) - the id or a field of a row of another table (see
+# TablePool). Every ?ref column with the same table and skew reads the same row, so
+# author_id and author_handle belong to the same user
+class RefColumn(Column):
+    def __init__(self,spec,table,field=None,skew=1.0):
+        super().__init__(spec)
+        self.table = table
+        self.field = field
+        self.skew = skew
+
+    def value(self,dataset):
+        row = dataset.ref_rows(self.table,self.skew)
+        return dataset.tables[self.table].value(self.field,row)
+
+    def batch(self,dataset,num):
+        rows = dataset.ref_rows(self.table,self.skew,num)
+        return dataset.tables[self.table].take(self.field,rows)
+
+    def cardinality(self):
+        return None
+
+    def shared(self):
+        return {(self.table,self.skew)}
+
+# Splits 'type(a,b,c)' into ('type',['a','b','c']) - params is None without parentheses
+def split_spec(spec):
+    val = spec.strip().lstrip('?')
+    if '(' not in val:
+        return val,None
+    val_type,params = val.split('(',1)
+    if not params.endswith(')'):
+        raise ValueError(f'missing closing parenthesis in {spec!r}')
+    return val_type,[param.strip() for param in params[0:-1].split(',')]
+
+# Converts the params of a spec to ints, checking how many were given
+def int_params(spec,params,count):
+    if params is None or len(params) != count:
+        raise ValueError(f'{spec!r} expects {count} integer parameters')
+    try:
+        return [int(param) for param in params]
+    except ValueError:
+        raise ValueError(f'{spec!r} has non-integer parameters') from None
+
+# Splits a spec on the '+' signs outside parentheses and quotes
+def split_parts(spec):
+    parts = ['']
+    depth = 0
+    quote = None
+    for char in spec.strip().lstrip('?'):
+        if quote:
+            quote = None if char == quote else quote
+        elif char in '\'"':
+            quote = char
+        elif char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif char == '+' and depth == 0:
+            parts.append('')
+            continue
+        parts[-1] += char
+    return parts
+
+# A part of a composed spec is literal text if it is quoted or not a type name (eg. '-')
+def compile_part(part):
+    stripped = part.strip()
+    if len(stripped) >= 2 and stripped[0] == stripped[-1] and stripped[0] in '\'"':
+        return Column(stripped[1:-1])
+    if not re.fullmatch(r'[A-Za-z_]\w*(\(.*\))?',stripped):
+        return Column(stripped)
+    return compile_spec(stripped)
+
+# Returns the characters in ranges like 'A-Z', 'a-z0-9' or 'AEIOU'
+def char_range(spec,params):
+    chars = []
+    for param in params or []:
+        ind = 0
+        while ind < len(param):
+            if ind+2 < len(param) and param[ind+1] == '-':
+                if param[ind] > param[ind+2]:
+                    raise ValueError(f'{spec!r} has an empty range {param[ind:ind+3]!r}')
+                chars.extend(chr(code) for code in range(ord(param[ind]),ord(param[ind+2])+1))
+                ind += 3
+            else:
+                chars.append(param[ind])
+                ind += 1
+    if not chars:
+        raise ValueError(f'{spec!r} expects a character range, eg. char(A-Z)')
+    return list(dict.fromkeys(chars))
+
+# Types that take parameters
+PARAM_TYPES = ('int','count','date','datetime','timestamp','fixedint','char','callnumber','ref')
+DATE_OPTIONS = ('weekdays','business')
+
+# Compiles a generated entry ('?type', '?type(params)' or several of them joined with
+# '+') into a column object. Raises ValueError for unknown types and bad parameters.
+def compile_spec(spec):
+    import datetime as dt
+    import functools
+    parts = split_parts(spec)
+    if len(parts) > 1:
+        column = ComposedColumn(spec,[compile_part(part) for part in parts])
+        column.kind = 'composed'
+        return column
+
+    val_type,params = split_spec(spec)
+    if params is not None and val_type not in PARAM_TYPES:
+        raise ValueError(f'{spec!r} does not take parameters')
+
+    match val_type:
+        case 'int' if params is not None and len(params) == 2:
+            vmin,vmax = int_params(spec,params,2)
+            if vmin > vmax:
+                raise ValueError(f'{spec!r} needs min <= max')
+            column = RangeColumn(spec,vmin,vmax)
+        case 'int' | 'count':
+            shape = COUNT_SHAPES[0]
+            if params is not None and len(params) == 4:
+                shape = params.pop().lower()
+            vmin,vmedian,vmax = int_params(spec,params,3)
+            if not 0 <= vmin <= vmedian <= vmax:
+                raise ValueError(f'{spec!r} needs 0 <= min <= median <= max')
+            column = IntColumn(spec,vmin,vmedian,vmax,shape)
+        case 'fixedint':
+            digits, = int_params(spec,params,1)
+            if digits < 1:
+                raise ValueError(f'{spec!r} needs at least 1 digit')
+            column = GeneratorColumn(spec,functools.partial(fake_fixedint,digits),
+                                     functools.partial(fixedint_batch,digits=digits),10**digits)
+        case 'char':
+            column = ListColumn(spec,char_range(spec,params))
+        case 'issn':
+            column = GeneratorColumn(spec,fake_issn,issn_batch,10**7)
+        case 'isbn':
+            column = GeneratorColumn(spec,fake_isbn,isbn_batch,10**9)
+        case 'isxn':
+            column = GeneratorColumn(spec,fake_isxn,isxn_batch,10**7+10**9)
+        case 'comment':
+            column = TemplateColumn(spec,'sentence')
+        case 'callnumber':
+            system = params[0].lower() if params else None
+            if params is not None and (len(params) != 1 or system not in ('loc','dewey')):
+                raise ValueError(f'{spec!r} expects loc or dewey')
+            column = TemplateColumn(spec,'callnumber' if system is None else f'callnumber_{system}')
+        case 'date' | 'datetime' | 'timestamp':
+            if params is None or len(params) < 2:
+                raise ValueError(f'{spec!r} expects a start and end date')
+            try:
+                start,end = [dt.date.fromisoformat(param) for param in params[:2]]
+            except ValueError:
+                raise ValueError(f'{spec!r} dates must be in YYYY-MM-DD format') from None
+            if end < start:
+                raise ValueError(f'{spec!r} ends before it starts')
+            options = [param.lower() for param in params[2:]]
+            zones = [param for param in params[2:] if param.lower() not in DATE_OPTIONS]
+            if zones and val_type != 'timestamp' or len(zones) > 1:
+                raise ValueError(f'{spec!r} has unknown options - use {", ".join(DATE_OPTIONS)}'
+                                 + (' and a time zone' if val_type == 'timestamp' else ''))
+            if 'business' in options and val_type == 'date':
+                raise ValueError(f'{spec!r} business hours need a datetime or timestamp')
+            tz = None
+            if val_type == 'timestamp':
+                import zoneinfo
+                tz = zones[0] if zones else 'UTC'
+                try:
+                    zoneinfo.ZoneInfo(tz)
+                except (ValueError,zoneinfo.ZoneInfoNotFoundError):
+                    raise ValueError(f'{spec!r} has an unknown time zone {tz!r}') from None
+            dates = DateRange(start,end,'weekdays' in options,'business' in options)
+            column = DateColumn(spec,dates,'D' if val_type == 'date' else 's',tz)
+        case 'email':
+            column = UserColumn(spec,'email')
+        case 'fullname':
+            column = UserColumn(spec,'name')
+        case 'fullname_rev':
+            column = UserColumn(spec,'rev_name')
+        case 'firstname':
+            column = UserColumn(spec,'given')
+        case 'lastname':
+            column = UserColumn(spec,'family')
+        case 'handle':
+            column = UserColumn(spec,'handle')
+        case 'id':
+            column = IdColumn(spec)
+        case 'ref':
+            if params is None or len(params) not in (1,2):
+                raise ValueError(f'{spec!r} expects a table (eg. ref(users) or ref(users.handle)) and an optional skew')
+            table,sep,field = params[0].partition('.')
+            if not table.isidentifier() or (sep and not field):
+                raise ValueError(f'{spec!r} has a bad table reference {params[0]!r}')
+            try:
+                skew = float(params[1]) if len(params) == 2 else 1.0
+            except ValueError:
+                raise ValueError(f'{spec!r} skew must be a number') from None
+            if skew < 0:
+                raise ValueError(f'{spec!r} skew must be >= 0')
+            column = RefColumn(spec,table,field or None,skew)
+        case _ if params is None and val_type in get_templates().kinds:
+            column = TemplateColumn(spec,val_type)
+        case _:
+            raise ValueError(f'unknown type {val_type!r} in {spec!r}')
+    column.kind = val_type
+    return column
+
+## ===================================================================================
+##   UNIQUE COLUMNS: the !unique modifier (eg. email=?email!unique). Values already used
+##   are kept in an index; colliding values are regenerated ('retry', the default) or 
+##   given a numeric disambiguator ('suffix'). The index can be
+##     set    - a Python set of the values: exact, the default
+##     bloom  - a Bloom filter: a few bytes per value, occasionally rejects a new value
+##     sorted - sorted runs of 64-bit hashes: 8 bytes per value
+##   None of them lets a duplicate through - bloom and sorted only cost extra retries
+## ===================================================================================
+
+UNIQUE_STRATEGIES = ('retry','suffix')
+UNIQUE_INDEXES = ('set','bloom','sorted')
+UNIQUE_CAPACITY = 10000000      # Bloom filter size when the row count is not known
+UNIQUE_ATTEMPTS = 100           # rounds of regeneration before giving up on a chunk
+BLOOM_ERROR_RATE = 1e-4
+UNSUFFIXED_KINDS = ('int','count','date','datetime','timestamp','id')   # suffixes would break their type
+
+# Splits '!unique' style modifiers off the end of a config value. Returns the value
+# and a dict of modifier name -> list of params
+def split_modifiers(value):
+    modifiers = {}
+    while True:
+        match = re.search(r'!(\w+)(?:\(([^()]*)\))?\s*$',value)
+        if not match:
+            return value,modifiers
+        params = [param.strip() for param in match[2].split(',')] if match[2] else []
+        modifiers[match[1]] = params
+        value = value[0:match.start()]
+
+# Returns (strategy,index) from the params of !unique(...), in any order
+def unique_options(params):
+    strategy,index = 'retry','set'
+    for param in params:
+        if param in UNIQUE_STRATEGIES:
+            strategy = param
+        elif param in UNIQUE_INDEXES:
+            index = param
+        else:
+            raise ValueError(f'unknown !unique option {param!r} - use {", ".join(UNIQUE_STRATEGIES+UNIQUE_INDEXES)}')
+    return strategy,index
+
+# 64-bit hashes of an array of values (strings, numbers or dates)
+def hash_values(values,key='pyDatasetGen-hsh'):
+    import pandas as pd
+    return pd.util.hash_array(values,hash_key=key)
+
+# Marks the first occurrence of each hash in an array
+def first_occurrences(hashes):
+    import numpy as np
+    first = np.zeros(len(hashes),dtype=bool)
+    first[np.unique(hashes,return_index=True)[1]] = True
+    return first
+
+# Each index has add_new(values): adds the values that are not in it yet, in order, and
+# returns a boolean array marking them (repeats within values only count once)
+class SetIndex:
+    def __init__(self,capacity=None):
+        self.seen = set()
+
+    def add_new(self,values):
+        import numpy as np
+        seen = self.seen
+        new = np.zeros(len(values),dtype=bool)
+        if isinstance(values,np.ndarray) and values.dtype != object:
+            values = values.tolist()      # Python ints and dates hash and pickle faster
+        for ind,value in enumerate(values):
+            if value not in seen:
+                seen.add(value)
+                new[ind] = True
+        return new
+
+class BloomIndex:
+    def __init__(self,capacity=None):
+        import math
+        import numpy as np
+        capacity = max(capacity or UNIQUE_CAPACITY,1000)
+        self.bits = -int(capacity*math.log(BLOOM_ERROR_RATE)/math.log(2)**2)
+        self.hashes = max(1,round(self.bits/capacity*math.log(2)))
+        self.table = np.zeros((self.bits+7)//8,dtype=np.uint8)
+
+    # Bit positions of every value, with double hashing: h1+i*h2
+    def positions(self,values):
+        import numpy as np
+        h1 = hash_values(values)
+        h2 = hash_values(values,'pyDatasetGen-bl2') | np.uint64(1)
+        steps = np.arange(self.hashes,dtype=np.uint64)
+        return (h1[:,None]+steps[None,:]*h2[:,None])%np.uint64(self.bits),h1
+
+    def add_new(self,values):
+        import numpy as np
+        positions,h1 = self.positions(values)
+        present = ((self.table[positions >> np.uint64(3)] >> (positions & np.uint64(7)).astype(np.uint8)) & 1).all(axis=1)
+        new = first_occurrences(h1) & ~present
+        added = positions[new].ravel()
+        np.bitwise_or.at(self.table,added >> np.uint64(3),np.left_shift(1,added & np.uint64(7)).astype(np.uint8))
+        return new
+
+class SortedIndex:
+    def __init__(self,capacity=None):
+        self.runs = []
+
+    def add_new(self,values):
+        import numpy as np
+        hashes = hash_values(values)
+        new = first_occurrences(hashes)
+        for run in self.runs:
+            found = np.searchsorted(run,hashes)
+            found[found == len(run)] = 0
+            new &= run[found] != hashes
+        if new.any():
+            self.runs.append(np.sort(hashes[new]))
+        # merge runs of similar size, so there are only O(log n) runs to search
+        while len(self.runs) > 1 and len(self.runs[-2]) <= 2*len(self.runs[-1]):
+            last = self.runs.pop()
+            self.runs[-1] = np.sort(np.concatenate([self.runs[-1],last]))
+        return new
+
+UNIQUE_INDEX_TYPES = {'set': SetIndex,'bloom': BloomIndex,'sorted': SortedIndex}
+
+# Adds k to a value to make it unique: before the @ of an email, otherwise at the end
+def disambiguate(value,k):
+    value = str(value)
+    if '@' in value:
+        local,domain = value.rsplit('@',1)
+        return f'{local}{k}@{domain}'
+    return f'{value}{k}'
+
+# Enforces the !unique columns of a DatasetGenerator over one run (generate(),
+# iter_chunks(), ...). It works on finished rows or chunks in the parent process, in
+# order, so the result is the same however many workers generated them. With a seed,
+# replacement values come from their own stream for each chunk
+class UniqueEnforcer:
+    def __init__(self,dataset,num=None):
+        self.dataset = dataset
+        self.indexes = {}
+        self.counters = {}
+        self.groups = []            # (unique keys,shared draws) of the 'retry' columns
+        self.suffixed = []          # keys of the 'suffix' columns
+        self.journal = None         # key -> (added values,changed counters), see keep_journal()
+        for key,(strategy,index) in dataset.unique.items():
+            column = dataset.columns[key]
+            count = column.cardinality()
+            if strategy == 'retry' and num is not None and count is not None and num > count:
+                raise ValueError(f'{key}: {column.spec!r} has at most {count} distinct values, too few '
+                                 f'for {num} unique rows - use !unique(suffix) or a wider spec')
+            self.indexes[key] = UNIQUE_INDEX_TYPES[index](num)
+            self.counters[key] = {}
+            if strategy == 'suffix':
+                self.suffixed.append(key)
+                continue
+            # retry columns that share a draw (eg. ?fullname and ?email) are redrawn together
+            keys,draws = [key],column.shared()
+            for group in [group for group in self.groups if group[1] & draws]:
+                self.groups.remove(group)
+                keys,draws = group[0]+keys,group[1] | draws
+            self.groups.append((keys,draws))
+
+    # Record what the indexes and counters gain from now on, so a DatasetJob can save
+    # each chunk's share of the state instead of all of it
+    def keep_journal(self):
+        self.journal = {key: ([],{}) for key in self.indexes}
+
+    # The journal since the last call, as key -> (array of added values,changed counters)
+    def take_journal(self):
+        import numpy as np
+        journal = {}
+        for key,(added,counters) in self.journal.items():
+            values = np.concatenate(added) if added else np.empty(0,dtype=object)
+            journal[key] = (values,counters)
+        self.keep_journal()
+        return journal
+
+    # Add a journal from take_journal() back into the indexes and counters
+    def replay(self,journal):
+        for key,(values,counters) in journal.items():
+            self.indexes[key].add_new(values)
+            self.counters[key].update(counters)
+
+    # index.add_new(values) for key, keeping the journal
+    def add_new(self,key,values):
+        new = self.indexes[key].add_new(values)
+        if self.journal is not None and new.any():
+            self.journal[key][0].append(values[new])
+        return new
+
+    # Keys of the columns to redraw with the unique keys of a group, in column order
+    def linked(self,keys,draws):
+        return [key for key,column in self.dataset.columns.items() if key in keys or column.shared() & draws]
+
+    # A copy of the dataset with its own random streams for chunk index
+    def fixer(self,index):
+        import copy
+        import numpy as np
+        fixer = copy.copy(self.dataset)
+        if fixer.seed is not None:
+            # shard index uses spawn keys (index,0) and (index,1) - see reseed()
+            fixer.reseed(np.random.SeedSequence(fixer.seed,spawn_key=(index,2)))
+        return fixer
+
+    # Makes the unique columns of a chunk (dict of column arrays) unique
+    def chunk(self,columns,index=0):
+        fixer = None
+        for keys,draws in self.groups:
+            linked = self.linked(keys,draws)
+            def redraw(rows):
+                nonlocal fixer
+                fixer = fixer or self.fixer(index)
+                if 'user' in draws:
+                    fixer.users = FakeUserBatch(len(rows),fixer.nprng,fixer.rng)
+                fixer.refs = {}       # ?ref columns draw fresh rows for the redrawn values
+                for key in linked:
+                    values = fixer.columns[key].batch(fixer,len(rows))
+                    columns[key][rows] = unique_values(values) if key in keys else values
+            for key in keys:
+                columns[key] = unique_values(columns[key])
+            self.resolve(keys,columns,redraw)
+        for key in self.suffixed:
+            columns[key] = self.suffix(key,unique_values(columns[key]))
+        return columns
+
+    # Makes the unique columns of a list of row dicts unique
+    def rows(self,rows,index=0):
+        import numpy as np
+        fixer = None
+        for keys,draws in self.groups:
+            linked = self.linked(keys,draws)
+            values = {}
+            for key in linked:
+                values[key] = np.empty(len(rows),dtype=object)
+                values[key][:] = [row[key] for row in rows]
+            def redraw(redrawn):
+                nonlocal fixer
+                fixer = fixer or self.fixer(index)
+                for ind in redrawn:
+                    if 'user' in draws:
+                        fixer.user = FakeUser(fixer.rng,fixer.user_fields)
+                    fixer.refs = {}
+                    for key in linked:
+                        values[key][ind] = fixer.columns[key].value(fixer)
+            self.resolve(keys,values,redraw)
+            for key in linked:
+                for row,value in zip(rows,values[key]):
+                    row[key] = value
+        for key in self.suffixed:
+            values = np.empty(len(rows),dtype=object)
+            values[:] = [row[key] for row in rows]
+            for row,value in zip(rows,self.suffix(key,values)):
+                row[key] = value
+        return rows
+
+    # Redraws the rows where any of keys repeats (values is a dict of key -> array) with
+    # redraw(rows) until none do. Values of a row that is redrawn because another of
+    # its keys repeated stay in the indexes - they are only ever treated as used
+    def resolve(self,keys,values,redraw):
+        import numpy as np
+        new = np.logical_and.reduce([self.add_new(key,values[key]) for key in keys])
+        for attempt in range(UNIQUE_ATTEMPTS):
+            rows = np.flatnonzero(~new)
+            if len(rows) == 0:
+                return
+            redraw(rows)
+            new[rows] = np.logical_and.reduce([self.add_new(key,values[key][rows]) for key in keys])
+        if not new.all():
+            specs = ', '.join(repr(self.dataset.columns[key].spec) for key in keys)
+            raise ValueError(f'{", ".join(keys)}: no unique value found after {UNIQUE_ATTEMPTS} attempts - the values '
+                             f'of {specs} are nearly used up, use !unique(suffix)')
+
+    # Returns values with a number added to every repeat (see disambiguate)
+    def suffix(self,key,values):
+        import numpy as np
+        values = np.array([str(value) for value in text_array(values)],dtype=object)
+        new = self.add_new(key,values)
+        index = self.indexes[key]
+        counters = self.counters[key]
+        rows = np.flatnonzero(~new)
+        for row in rows:
+            base = values[row]
+            k = counters.get(base,1)
+            while True:
+                k += 1
+                candidate = disambiguate(base,k)
+                if index.add_new(np.array([candidate],dtype=object))[0]:
+                    break
+            counters[base] = k
+            if self.journal is not None:
+                self.journal[key][1][base] = k
+            values[row] = candidate
+        if self.journal is not None and len(rows):
+            self.journal[key][0].append(values[rows])
+        return values
+
+# Numbers and dates are checked as they are, everything else as an object array of strings
+def unique_values(values):
+    import numpy as np
+    if isinstance(values,np.ndarray) and values.dtype.kind in 'iuM':
+        return values
+    return text_array(values)
+
+## ===================================================================================
+##   PROFILING: opt-in per-column instrumentation for DatasetGenerator(profile=True)
+## ===================================================================================
+
+# Size of values in bytes once written out as UTF-8 text
+def text_bytes(values):
+    return sum(len(str(value).encode('utf-8')) for value in values)
+
+# Cumulative seconds, calls, values and bytes per column and per column type.
+# FakeUser generation is recorded as its own '<users>' entry, and one-off loading as '<setup>'. callback, if given, is 
+# called as callback(key,kind,seconds,values,nbytes) for every timed call (in the 
+# worker process when workers > 1, so it has to be picklable there)
+class DatasetStats:
+    def __init__(self,callback=None):
+        self.callback = callback
+        self.columns = {}
+        self.types = {}
+
+    # key is None for calls that do not belong to a column (eg. parse())
+    def record(self,key,kind,seconds,values,nbytes):
+        tables = [(self.types,kind)] if key is None else [(self.columns,key),(self.types,kind)]
+        for table,name in tables:
+            entry = table.get(name)
+            if entry is None:
+                entry = table[name] = {'type': kind,'seconds': 0.0,'calls': 0,'values': 0,'bytes': 0}
+            entry['seconds'] += seconds
+            entry['calls'] += 1
+            entry['values'] += values
+            entry['bytes'] += nbytes
+        if self.callback is not None:
+            self.callback(key,kind,seconds,values,nbytes)
+
+    # Add the counts of another DatasetStats (eg. from a worker shard)
+    def merge(self,other):
+        for table,other_table in ((self.columns,other.columns),(self.types,other.types)):
+            for name,other_entry in other_table.items():
+                entry = table.setdefault(name,dict(other_entry,seconds=0.0,calls=0,values=0,bytes=0))
+                for field in ('seconds','calls','values','bytes'):
+                    entry[field] += other_entry[field]
+
+    def reset(self):
+        self.columns = {}
+        self.types = {}
+
+    def as_dict(self):
+        return {'columns': self.columns,'types': self.types}
+
+    def to_json(self,indent=2):
+        import json
+        return json.dumps(self.as_dict(),indent=indent)
+
+    # Text table of columns and types, slowest first
+    def report(self):
+        lines = []
+        for title,table in (('column',self.columns),('type',self.types)):
+            total = sum(entry['seconds'] for entry in table.values()) or 1.0
+            lines.append(f'{title:<24} {"type":<14} {"seconds":>10} {"share":>7} {"calls":>10} {"values":>10} {"bytes":>12}')
+            for name,entry in sorted(table.items(),key=lambda item: -item[1]['seconds']):
+                lines.append(f'{name:<24} {entry["type"]:<14} {entry["seconds"]:>10.4f} {entry["seconds"]/total:>7.1%} '
+                             f'{entry["calls"]:>10} {entry["values"]:>10} {entry["bytes"]:>12}')
+            lines.append('')
+        return '\n'.join(lines)
+
+    def __str__(self):
+        return self.report()
+
 ## ===================================================================================
 ##   DATASET GENERATOR: Generates datasets based on externally defined parameters
 ## ===================================================================================
 
+# Raises ValueError unless size (a chunk or batch size, or a number of workers) is at least 1
+def check_size(size,name='chunk_size'):
+    if size < 1:
+        raise ValueError(f'{name} must be at least 1, not {size}')
+
+# rng is used for row-by-row generation and nprng for the columnar batch engine. 
+# Pass a seed for reproducible output, or an rng (random.Random or numpy Generator) to share.
+# profile=True (or a DatasetStats) times every column into self.stats.
+# config=None starts with no columns, for schemas built up with load() or load_entries()
 class DatasetGenerator:
-    def __init__(self):
+    def __init__(self,seed=None,rng=None,profile=False,config='cfg_gen_dataset.txt'):
+        import numpy as np
         self.datatypes = {}
-        self.user = FakeUser()
-        self.load()
-
-    # Load configuration file
-    def load(self,filename='cfg_gen_dataset.txt'):   
-        try:     
-            lines = open(resource_path(filename),'r')
-        except:
-            print(f'ERROR - {filename} does not exist')
-        
-        for line in lines:
-            if not line.startswith('#') and not line=='\n':  # Ignore comments and empty lines
-                key, value = line.split('=')   
-                value = value.rstrip()
+        self.columns = {}
+        self.user_fields = set()
+        self.unique = {}            # column name -> (strategy,index) for !unique columns
+        self.tables = {}            # table name -> TablePool, for ?ref columns
+        self.refs = {}              # (table,skew) -> rows referenced by the current row or chunk
+        self.row = 0                # rows generated so far, for ?id columns
+        self.users = None
+        self.stats = None
+        if profile:
+            self.stats = profile if isinstance(profile,DatasetStats) else DatasetStats()
+        self.seed = seed
+        self.rng = make_rng(rng)
+        if isinstance(rng,np.random.Generator):
+            self.nprng = rng
+        elif isinstance(rng,NumpyRandom):
+            self.nprng = rng.generator
+        elif isinstance(rng,random.Random):   # seeded from rng, so batches follow it too
+            self.nprng = np.random.default_rng(rng.getrandbits(128))
+        else:
+            self.nprng = np.random.default_rng()
+        if seed is not None:
+            self.reseed(seed)
+        self.user = FakeUser(self.rng)
+        if config is not None:
+            self.load(config)
+
+    # Load configuration file and compile every entry into a column.
+    # Bad entries raise ValueError here rather than part way through generate()
+    def load(self,filename='cfg_gen_dataset.txt'):
+        with open(resource_path(filename),'r',encoding='utf-8') as lines:
+            self.load_entries(enumerate(lines,1),filename)
+
+    # Compile (lineno,line) pairs of config text - filename is only used in errors
+    def load_entries(self,entries,filename='<config>'):
+        for lineno,line in entries:
+            if line.startswith('#') or not line.strip():  # Ignore comments and empty lines
+                continue
+            if '=' not in line:
+                raise ValueError(f'{filename}:{lineno}: expected name=value, got {line.strip()!r}')
+            key, value = line.split('=',1)
+            value = value.rstrip()
+            try:
+                modifiers = {}
+                if value.startswith(('[','?')):
+                    value,modifiers = split_modifiers(value)
+                self.unique.pop(key,None)
+                for name,params in modifiers.items():
+                    if name != 'unique':
+                        raise ValueError(f'unknown modifier !{name}')
+                    self.unique[key] = unique_options(params)
                 if value.startswith('['):
                     value = value.replace('[','')
                     value = value.replace(']','')
                     list_values = value.split(',')
                     self.datatypes[key] = list_values
+                    self.columns[key] = ListColumn(value,list_values)
                 elif value.startswith('?'):
-                   self.datatypes[key] = value
+                    self.datatypes[key] = value
+                    self.columns[key] = compile_spec(value)
                 else:
                     self.datatypes[key] = value
-    
-    # Interpret variable elements
+                    self.columns[key] = Column(value)
+                if self.unique.get(key,('',))[0] == 'suffix' and self.columns[key].kind in UNSUFFIXED_KINDS:
+                    raise ValueError(f'!unique(suffix) cannot be used with ?{self.columns[key].kind} - use !unique')
+            except ValueError as err:
+                raise ValueError(f'{filename}:{lineno}: {key}: {err}') from None
+        # FakeUser fields the schema refers to - rows only build users if there are any
+        self.user_fields = {field for column in self.columns.values() for field in column.fields}
+
+    # Interpret a single variable element. Compiles the spec on every call, so
+    # it is only meant for one-off values - gen() uses the compiled columns
     def parse(self,value):
-        val = value.replace('?','')
-        parens = re.search('\\(',val)
-        result = ''
-        if parens: 
-            val_type,params = val.split('(')
-        else:
-            val_type = val                                
-        match val_type:
-            case 'sentence': 
-                result = fake_sentence()                                
-            case 'int':
-                vmin,vmax,vmedian = params[0:-1].split(',')
-                result = fake_num(int(vmin),int(vmax),int(vmedian))
-            case 'date':
-                vstart,vend = params[0:-1].split(',')
-                result = fake_date(vstart,vend)
-            case 'email':
-                result = self.user.email
-            case 'url':
-                result = fake_url()
-            case 'hashtag':
-                result = fake_hashtag()
-            case 'fullname':
-                result = self.user.name
-            case 'fullname_rev':
-                result = self.user.rev_name
-            case 'firstname':
-                result = self.user.given
-            case 'lastname':
-                result = self.user.family
-            case _:
-                result = val
+        if self.stats is None:
+            return compile_spec(value).value(self)
+        start = time.perf_counter()
+        column = compile_spec(value)
+        result = column.value(self)
+        self.stats.record(None,column.kind,time.perf_counter()-start,1,text_bytes((result,)))
         return result
     
     # Generate each dataset entry
     def gen(self):
-        result = {}        
-        self.user = FakeUser()
-        for key in self.datatypes.keys():
-            value = self.datatypes[key]            
-            if type(value) is list:
-                result[key] = choose(value)
-            elif value.startswith("?"):
-                result[key] = self.parse(value)
+        if self.stats is not None:
+            return self.gen_profiled()
+        if self.user_fields:
+            self.user = FakeUser(self.rng,self.user_fields)
+        self.refs = {}
+        row = {key: column.value(self) for key,column in self.columns.items()}
+        self.row += 1
+        return row
+
+    # gen() with every column timed into self.stats
+    def gen_profiled(self):
+        stats = self.stats
+        self.setup_profiled()
+        if self.user_fields:
+            start = time.perf_counter()
+            self.user = FakeUser(self.rng,self.user_fields)
+            stats.record('<users>','FakeUser',time.perf_counter()-start,1,0)
+        self.refs = {}
+        row = {}
+        for key,column in self.columns.items():
+            start = time.perf_counter()
+            row[key] = column.value(self)
+            stats.record(key,column.kind,time.perf_counter()-start,1,text_bytes((row[key],)))
+        self.row += 1
+        return row
+    
+    # Generate one batch of num rows column by column from the current random state.
+    # Returns a dict of column name -> array, with list, ?int and ?date columns 
+    # drawn in bulk from self.nprng
+    def gen_columns(self,num):
+        if self.stats is not None:
+            return self.gen_columns_profiled(num)
+        if self.user_fields:
+            self.users = FakeUserBatch(num,self.nprng,self.rng)
+        self.refs = {}
+        columns = {key: column.batch(self,num) for key,column in self.columns.items()}
+        self.users = None
+        self.refs = {}
+        self.row += num
+        return columns
+
+    # gen_columns() with every column timed into self.stats. User fields are built on
+    # first use, so their cost is counted against the first column that needs them
+    def gen_columns_profiled(self,num):
+        stats = self.stats
+        self.setup_profiled(batch=True)
+        if self.user_fields:
+            start = time.perf_counter()
+            self.users = FakeUserBatch(num,self.nprng,self.rng)
+            stats.record('<users>','FakeUser',time.perf_counter()-start,num,0)
+        self.refs = {}
+        columns = {}
+        for key,column in self.columns.items():
+            start = time.perf_counter()
+            columns[key] = column.batch(self,num)
+            stats.record(key,column.kind,time.perf_counter()-start,num,text_bytes(columns[key]))
+        self.users = None
+        self.refs = {}
+        self.row += num
+        return columns
+
+    # Imports and shared tables (names, templates) are loaded on first use, which would
+    # charge them to whichever column happens to come first. When profiling, they are
+    # loaded up front once per DatasetStats and recorded as '<setup>' instead
+    def setup_profiled(self,batch=False):
+        stats = self.stats
+        if '<setup>' in stats.columns:
+            return
+        start = time.perf_counter()
+        if batch:
+            import importlib
+            for module in ('numpy','pandas'):
+                importlib.import_module(module)
+        get_name_generator()
+        get_templates()
+        stats.record('<setup>','setup',time.perf_counter()-start,0,0)
+
+    # Rows of table referenced by the current row (one row index) or chunk (num row
+    # indices). ?ref columns with the same table and skew share one draw
+    def ref_rows(self,table,skew=1.0,num=None):
+        key = (table,skew)
+        if key not in self.refs:
+            pool = self.tables.get(table)
+            if pool is None:
+                raise ValueError(f'no table {table!r} to reference - generate it with a DatasetSchema')
+            if num is None:
+                self.refs[key] = pool.draw_one(self.rng,skew)
             else:
-                result[key] = value
+                self.refs[key] = pool.draw(self.nprng,num,skew)
+        return self.refs[key]
+
+    # Seed the generator's random streams from an int or a numpy SeedSequence
+    def reseed(self,seed):
+        import numpy as np
+        seq = seed if isinstance(seed,np.random.SeedSequence) else np.random.SeedSequence(seed)
+        np_seq,py_seq = seq.spawn(2)
+        self.nprng = np.random.default_rng(np_seq)
+        self.rng = random.Random(int.from_bytes(py_seq.generate_state(4).tobytes(),'little'))
+
+    # Split num rows (or an endless stream if num is None) into shards of shard_size.
+    # Each shard gets its own seed derived from the master seed and the shard index,
+    # so a shard's rows do not depend on which process generates it or when
+    # first_index and first_row continue the numbering of an earlier run (see DatasetJob).
+    # num=0 gives one empty shard, so zero rows still come back as typed, empty columns
+    def shards(self,num,shard_size,kind,first_index=0,first_row=0):
+        import numpy as np
+        entropy = self.seed if self.seed is not None else np.random.SeedSequence().entropy
+        index = first_index
+        done = 0
+        while True:
+            size = shard_size if num is None else min(shard_size,num-done)
+            yield (self,np.random.SeedSequence(entropy,spawn_key=(index,)),first_row+done,size,kind)
+            index += 1
+            done += size
+            if num is not None and done >= num:
+                return
+
+    # Run shard tasks on a pool of worker processes and yield the results in shard
+    # order. At most two shards per worker are in flight, so memory stays bounded.
+    # Referenced tables are sent to each worker once, not with every task
+    def run_shards(self,tasks,workers=1):
+        check_size(workers,'workers')
+        if workers <= 1:
+            for task in tasks:
+                yield self.shard_result(generate_shard(task))
+            return
+
+        import copy
+        from concurrent.futures import ProcessPoolExecutor
+        from collections import deque
+        names = {draw[0] for column in self.columns.values() for draw in column.shared() if draw != 'user'}
+        tables = {name: self.tables[name] for name in names if name in self.tables}
+        dataset = copy.copy(self)
+        dataset.tables = {}
+        with ProcessPoolExecutor(workers,initializer=init_shard_worker,initargs=(tables,)) as pool:
+            pending = deque()
+            for task in tasks:
+                pending.append(pool.submit(generate_shard,(dataset,)+task[1:]))
+                if len(pending) >= 2*workers:
+                    yield self.shard_result(pending.popleft().result())
+            while pending:
+                yield self.shard_result(pending.popleft().result())
+
+    # When profiling, shards come back as (result,stats) - merge the stats
+    def shard_result(self,result):
+        if self.stats is None:
+            return result
+        result,stats = result
+        self.stats.merge(stats)
         return result
-    
-    # Generate dataset
-    def generate(self,num=100):
+
+    # Generate dataset. With workers > 1 (or a seed) the rows are split into one shard
+    # per worker, so the output is identical for the same (seed, num, workers)
+    def generate(self,num=100,workers=1):
+        check_size(workers,'workers')
+        unique = UniqueEnforcer(self,num)
+        self.row = 0
+        if workers <= 1 and self.seed is None:
+            return unique.rows([self.gen() for ind in range(num)])
         results = []
-        for ind in range(0,num):
-            results.append(self.gen())
+        for index,rows in enumerate(self.run_shards(self.shards(num,-(-num//workers),'rows'),workers)):
+            results.extend(unique.rows(rows,index))
         return results
-    
+
+    # Generate num rows column by column, sharded across workers like generate()
+    def generate_columns(self,num=100,workers=1):
+        check_size(workers,'workers')
+        unique = UniqueEnforcer(self,num)
+        self.row = 0
+        if workers <= 1 and self.seed is None:
+            return unique.chunk(self.gen_columns(num))
+        shards = self.run_shards(self.shards(num,-(-num//workers),'columns'),workers)
+        return concat_columns(unique.chunk(columns,index) for index,columns in enumerate(shards))
+
+    # Generate dataset as a pandas DataFrame built straight from the column arrays
+    def generate_frame(self,num=100,workers=1):
+        import pandas as pd
+        return pd.DataFrame(self.generate_columns(num,workers))
+
+    # Generate dataset as a pyarrow Table, with list columns dictionary-encoded
+    def generate_table(self,num=100,workers=1):
+        return arrow_table(self.generate_columns(num,workers),self.list_columns())
+
+    # Generate dataset as a dict of NumPy arrays (see numpy_columns)
+    def generate_arrays(self,num=100,workers=1):
+        return numpy_columns(self.generate_columns(num,workers))
+
+    # Columns picked from a [list], mapped to their categories
+    def list_columns(self):
+        return {key: column.categories for key,column in self.columns.items() if column.kind == 'list'}
+
+    # Yield rows one at a time (as gen() dicts) - runs forever if num is None
+    def iter_rows(self,num=None):
+        unique = UniqueEnforcer(self,num)
+        self.row = 0
+        ind = 0
+        while num is None or ind < num:
+            yield unique.rows([self.gen()],ind)[0]
+            ind += 1
+
+    # Yield the dataset as column dicts of at most chunk_size rows, so only a few
+    # chunks are held in memory at a time - runs forever if num is None.
+    # With workers > 1 (or a seed) every chunk is a separately seeded shard, so the
+    # output depends on (seed, num, chunk_size) but not on the number of workers.
+    # first_chunk, first_row and unique (a UniqueEnforcer) continue an earlier run
+    def iter_chunks(self,num=None,chunk_size=100000,workers=1,first_chunk=0,first_row=0,unique=None):
+        check_size(chunk_size)
+        check_size(workers,'workers')
+        if unique is None:
+            unique = UniqueEnforcer(self,num)
+        self.row = first_row
+        if workers <= 1 and self.seed is None:
+            done = 0
+            index = first_chunk
+            while True:                 # num=0 still yields one empty chunk, like shards()
+                size = chunk_size if num is None else min(chunk_size,num-done)
+                yield unique.chunk(self.gen_columns(size),index)
+                done += size
+                index += 1
+                if num is not None and done >= num:
+                    return
+        else:
+            shards = self.shards(num,chunk_size,'columns',first_chunk,first_row)
+            for index,columns in enumerate(self.run_shards(shards,workers),first_chunk):
+                yield unique.chunk(columns,index)
+
+    # Generate num rows straight to a CSV, JSON Lines, Parquet, Arrow, Feather or npz file, chunk by chunk.
+    # With parts=True each chunk goes to its own numbered file (eg. data-00003.csv)
+    def write(self,filename,num=100,chunk_size=100000,fmt=None,workers=1,parts=False):
+        check_size(chunk_size)
+        check_size(workers,'workers')
+        chunks = self.iter_chunks(num,chunk_size,workers)
+        dictionary = self.list_columns()
+        if not parts:
+            with DatasetWriter(filename,fmt,dictionary=dictionary) as writer:
+                for chunk in chunks:
+                    writer.write(chunk)
+            return
+
+        root,ext = os.path.splitext(filename)
+        done = 0
+        for index,chunk in enumerate(chunks):
+            with DatasetWriter(f'{root}-{index:05d}{ext}',fmt,first_row=done,dictionary=dictionary) as writer:
+                writer.write(chunk)
+                done = writer.rows
+
+    # Resumable write(..., parts=True) - see DatasetJob. Running it again continues an
+    # interrupted job, and a larger num adds rows to a finished one
+    def write_job(self,filename,num=100,chunk_size=100000,fmt=None,workers=1):
+        job = DatasetJob(self,filename,chunk_size,fmt)
+        job.run(num,workers)
+        return job
+
+    # Fingerprint of everything that decides the generated values: the compiled columns,
+    # their !unique options and the word list, name and template files
+    def schema_hash(self):
+        import hashlib
+        digest = hashlib.sha256()
+        for key,column in self.columns.items():
+            digest.update(f'{key}={column.spec}!{self.unique.get(key)}\n'.encode('utf-8'))
+        for filename in ('cfg_gen_base.txt','cfg_gen_names.txt','cfg_gen_templates.txt'):
+            with open(resource_path(filename),'rb') as f:
+                digest.update(f.read())
+        return digest.hexdigest()
+
     # Print contents of the dataset
     def print(self):
         print(self.datatypes)
 
+# TablePools for ?ref columns in a worker process, set once by init_shard_worker
+_shard_tables = None
+
+def init_shard_worker(tables):
+    global _shard_tables
+    _shard_tables = tables
+
+# Worker entry point for DatasetGenerator.run_shards - reseeds the dataset for the
+# shard, starts its row count at the shard's first row and generates its rows ('rows')
+# or column arrays ('columns'). When profiling, the shard is timed into fresh stats
+# and (result,stats) is returned for merging
+def generate_shard(task):
+    dataset,seed,first,num,kind = task
+    if _shard_tables is not None:
+        dataset.tables = _shard_tables
+    dataset.reseed(seed)
+    dataset.row = first
+    stats = dataset.stats
+    if stats is not None:
+        dataset.stats = DatasetStats(stats.callback)
+    if kind == 'rows':
+        result = [dataset.gen() for ind in range(num)]
+    else:
+        result = dataset.gen_columns(num)
+    if stats is None:
+        return result
+    shard_stats,dataset.stats = dataset.stats,stats
+    return result,shard_stats
+
+# Joins a sequence of column dicts (eg. shards or chunks) into one column dict
+def concat_columns(parts):
+    import numpy as np
+    import pandas as pd
+    merged = {}
+    for part in parts:
+        for key,values in part.items():
+            merged.setdefault(key,[]).append(values)
+    for key,values in merged.items():
+        if all(isinstance(value,np.ndarray) for value in values):
+            merged[key] = np.concatenate(values)
+        elif all(isinstance(value,pd.Categorical) for value in values):
+            merged[key] = pd.Categorical.from_codes(np.concatenate([value.codes for value in values]),
+                                                    categories=values[0].categories)
+        elif all(hasattr(value,'tz') for value in values):
+            merged[key] = pd.concat([pd.Series(value) for value in values],ignore_index=True).array
+        else:
+            merged[key] = [item for value in values for item in value]
+    return merged
+
+## ===================================================================================
+##   COLUMN CONVERSION: column dicts (as from generate_columns) to Arrow and NumPy 
+##   without going through a DataFrame
+## ===================================================================================
+
+# Returns a pyarrow Table. Numeric and date columns are converted without copying
+# where possible. dictionary maps column names to their list of possible values: those
+# columns are dictionary-encoded against the full list, so every chunk of a file
+# shares the same dictionary
+def arrow_table(columns,dictionary=None):
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    dictionary = dictionary or {}
+    arrays = []
+    for key,values in columns.items():
+        array = pa.array(values,from_pandas=True)
+        if key in dictionary and not pa.types.is_dictionary(array.type):
+            items = pa.array(dictionary[key],type=array.type)
+            array = pa.DictionaryArray.from_arrays(pc.index_in(array,value_set=items),items)
+        arrays.append(array)
+    return pa.Table.from_arrays(arrays,names=list(columns))
+
+# Returns the columns as plain NumPy arrays: numbers and dates keep their dtype (time
+# zone aware timestamps become datetime64 in UTC) and text becomes a fixed-width
+# unicode array, so the result can be saved without pickling
+def numpy_columns(columns):
+    import numpy as np
+    arrays = {}
+    for key,values in columns.items():
+        if hasattr(values,'tz'):
+            values = values.tz_convert('UTC').tz_localize(None)
+        values = np.asarray(values)
+        if values.dtype == object:
+            values = values.astype(str)
+        arrays[key] = values
+    return arrays
+
+## ===================================================================================
+##   DATASET WRITER: Appends column chunks from DatasetGenerator.iter_chunks() to a 
+##   CSV, JSON Lines, Parquet, Arrow/Feather or NumPy file
+## ===================================================================================
+
+WRITER_FORMATS = {'.csv':'csv','.jsonl':'jsonl','.ndjson':'jsonl','.parquet':'parquet',
+                  '.arrow':'arrow','.feather':'feather','.npz':'npz'}
+
+# One JSON Lines row per row of a column dict, with dates as text (see date_strings)
+# and numbers as JSON numbers
+def jsonl_lines(columns):
+    import json
+    import numpy as np
+    lists = []
+    for values in columns.values():
+        if hasattr(values,'categories'):       # pd.Categorical
+            values = np.asarray(values)
+        if hasattr(values,'tz') or isinstance(values,np.ndarray) and values.dtype.kind == 'M':
+            values = date_strings(values)
+        if isinstance(values,np.ndarray):
+            values = values.tolist()
+        lists.append(values)
+    keys = list(columns)
+    for row in zip(*lists):
+        yield json.dumps(dict(zip(keys,row)),ensure_ascii=False)+'\n'
+
+# Parquet files get one row group per chunk and Arrow/Feather files one record batch
+# per chunk, so memory use is bounded by the chunk size. npz archives cannot be 
+# appended to, so those chunks are kept until close(). dictionary maps the columns to
+# dictionary-encode in the Arrow based formats to their values (see arrow_table)
+class DatasetWriter:
+    def __init__(self,filename,fmt=None,first_row=0,dictionary=None):
+        if fmt is None:
+            fmt = WRITER_FORMATS.get(os.path.splitext(filename)[1].lower())
+        if fmt not in WRITER_FORMATS.values():
+            raise ValueError(f'unsupported output format for {filename!r} - use csv, jsonl, parquet, arrow, feather or npz')
+        self.filename = filename
+        self.fmt = fmt
+        self.first_row = first_row
+        self.rows = first_row
+        self.dictionary = dictionary or {}
+        self.handle = None
+        self.writer = None
+        self.chunks = []
+        if fmt in ('parquet','arrow','feather'):
+            import importlib.util
+            if importlib.util.find_spec('pyarrow') is None:
+                raise ImportError(f'writing {fmt} files requires pyarrow')
+        elif fmt in ('csv','jsonl'):
+            self.handle = open(filename,'w',encoding='utf-8',newline='')
+
+    # Append one chunk (a dict of column name -> array, as from generate_columns)
+    def write(self,columns):
+        num = len(next(iter(columns.values()))) if columns else 0
+        match self.fmt:
+            case 'csv':
+                import pandas as pd
+                pd.DataFrame(columns).to_csv(self.handle,header=self.rows == self.first_row,index=False)
+            case 'jsonl':
+                self.handle.writelines(jsonl_lines(columns))
+            case 'parquet':
+                import pyarrow.parquet as pq
+                table = arrow_table(columns,self.dictionary)
+                if self.writer is None:
+                    self.writer = pq.ParquetWriter(self.filename,table.schema)
+                self.writer.write_table(table)
+            case 'arrow' | 'feather':
+                import pyarrow as pa
+                table = arrow_table(columns,self.dictionary)
+                if self.writer is None:
+                    options = None
+                    if self.fmt == 'feather' and pa.Codec.is_available('lz4'):
+                        options = pa.ipc.IpcWriteOptions(compression='lz4')
+                    self.writer = pa.ipc.new_file(self.filename,table.schema,options=options)
+                self.writer.write_table(table)
+            case 'npz':
+                self.chunks.append(columns)
+        self.rows += num
+
+    def close(self):
+        if self.handle is not None:
+            self.handle.close()
+            self.handle = None
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        if self.fmt == 'npz' and self.chunks is not None:
+            import numpy as np
+            np.savez(self.filename,**numpy_columns(concat_columns(self.chunks)))
+            self.chunks = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*exc):
+        self.close()
+
+## ===================================================================================
+##   RESUMABLE JOBS: chunks written to numbered files (data-00000.csv, ...) next to a
+##   manifest (data.manifest.json) that is rewritten after every chunk. Seeded chunks
+##   draw from their own streams, keyed by (seed, chunk index), so the random state
+##   needed to continue is just the seed and the next chunk index. The values each chunk
+##   adds to the !unique indexes are pickled next to it (data.unique-00000.pkl, ...) and
+##   replayed on resume, so later chunks still avoid earlier values
+## ===================================================================================
+
+JOB_VERSION = 2
+
+class DatasetJob:
+    def __init__(self,dataset,filename,chunk_size=100000,fmt=None):
+        if fmt is None:
+            fmt = WRITER_FORMATS.get(os.path.splitext(filename)[1].lower())
+        if fmt not in WRITER_FORMATS.values():
+            raise ValueError(f'unsupported output format for {filename!r} - use csv, jsonl, parquet, arrow, feather or npz')
+        check_size(chunk_size)
+        self.dataset = dataset
+        self.root,self.ext = os.path.splitext(filename)
+        self.fmt = fmt
+        self.chunk_size = chunk_size
+        self.manifest_path = self.root+'.manifest.json'
+        self.manifest = self.read()
+
+    @property
+    def rows(self):
+        return self.manifest['rows'] if self.manifest else 0
+
+    # File name of chunk index - partial=True is the name it is written under until complete
+    # (keeping the extension, which np.savez would otherwise add)
+    def part(self,index,partial=False):
+        return f'{self.root}-{index:05d}{".partial" if partial else ""}{self.ext}'
+
+    # Load the manifest of an earlier run, checking it was made by the same schema and
+    # settings. A dataset without a seed takes the job's seed
+    def read(self):
+        import json
+        if not os.path.exists(self.manifest_path):
+            return None
+        with open(self.manifest_path,'r',encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('version') != JOB_VERSION:
+            raise ValueError(f'{self.manifest_path}: unsupported manifest version {manifest.get("version")!r}')
+        if manifest['schema'] != self.dataset.schema_hash():
+            raise ValueError(f'{self.manifest_path}: the dataset config has changed since this job was started')
+        for field,value in (('chunk_size',self.chunk_size),('format',self.fmt)):
+            if manifest[field] != value:
+                raise ValueError(f'{self.manifest_path}: job was started with {field} {manifest[field]!r}, not {value!r}')
+        if self.dataset.seed is None:
+            self.dataset.seed = manifest['seed']
+        elif self.dataset.seed != manifest['seed']:
+            raise ValueError(f'{self.manifest_path}: job was started with seed {manifest["seed"]!r}')
+        return manifest
+
+    # Write the manifest (and the chunk's !unique journal, if any) for the chunks done so
+    # far. Each file is written under a temporary name and renamed, so a crash leaves
+    # either the old or the new checkpoint
+    def checkpoint(self,chunks,rows,parts,states,unique):
+        import json
+        import pickle
+        if unique.indexes:
+            state = f'{os.path.basename(self.root)}.unique-{chunks-1:05d}.pkl'
+            path = os.path.join(os.path.dirname(self.root),state)
+            with open(path+'.tmp','wb') as f:
+                pickle.dump(unique.take_journal(),f,protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(path+'.tmp',path)
+            states.append(state)
+        manifest = {
+            'version': JOB_VERSION,
+            'schema': self.dataset.schema_hash(),
+            'seed': self.dataset.seed,
+            'chunk_size': self.chunk_size,
+            'format': self.fmt,
+            'rows': rows,
+            'chunks': chunks,
+            'rng': {'entropy': self.dataset.seed,'next_spawn_key': [chunks]},
+            'unique_state': states,
+            'parts': parts,
+        }
+        with open(self.manifest_path+'.tmp','w',encoding='utf-8') as f:
+            json.dump(manifest,f,indent=2)
+        os.replace(self.manifest_path+'.tmp',self.manifest_path)
+        self.manifest = manifest
+
+    # Generate chunks until the job has num rows in total
+    def run(self,num,workers=1):
+        import pickle
+        import numpy as np
+        dataset = self.dataset
+        if dataset.seed is None:
+            dataset.seed = int(np.random.SeedSequence().entropy)
+        unique = UniqueEnforcer(dataset,num)
+        manifest = self.manifest or {'rows': 0,'chunks': 0,'parts': [],'unique_state': []}
+        for state in manifest['unique_state']:
+            with open(os.path.join(os.path.dirname(self.root),state),'rb') as f:
+                unique.replay(pickle.load(f))
+        unique.keep_journal()
+        rows,index,parts = manifest['rows'],manifest['chunks'],list(manifest['parts'])
+        states = list(manifest['unique_state'])
+        if rows >= num:
+            return
+        chunks = dataset.iter_chunks(num-rows,self.chunk_size,workers,index,rows,unique)
+        dictionary = dataset.list_columns()
+        for chunk in chunks:
+            path = self.part(index)
+            with DatasetWriter(self.part(index,True),self.fmt,first_row=rows,dictionary=dictionary) as writer:
+                writer.write(chunk)
+            os.replace(self.part(index,True),path)
+            parts.append([os.path.basename(path),writer.rows-rows])
+            rows = writer.rows
+            index += 1
+            self.checkpoint(index,rows,parts,states,unique)
+
+    # Add num more rows to the job
+    def append(self,num,workers=1):
+        self.run(self.rows+num,workers)
+
+## ===================================================================================
+##   TABLES: related tables generated together from a schema file (cfg_gen_schema.txt).
+##   Tables are generated in order, and the columns that later tables ?ref are kept as
+##   a TablePool, so a posts table draws its authors from one pool of users instead of
+##   making a new FakeUser for every row. References are drawn in bulk with a skew
+## ===================================================================================
+
+SCHEMA_HEADER = re.compile(r'\[(\w+)(?::(\d+))?\]\s*$')    # [name] or [name:rows]
+
+# The referenced columns of a generated table, indexed by row position. Rows are
+# referenced with a Zipf-like skew: the row ranked r is picked in proportion to
+# 1/r**skew (skew 0 is uniform), and the ranks are shuffled across the table so that
+# the popular rows are not simply the first ones
+class TablePool:
+    def __init__(self,name,num,columns,id_key=None,nprng=None):
+        import numpy as np
+        self.name = name
+        self.num = num
+        self.columns = {}
+        for key,values in columns.items():
+            if not isinstance(values,np.ndarray) and not hasattr(values,'categories') and not hasattr(values,'tz'):
+                values = np.asarray(values,dtype=object)
+            self.columns[key] = values
+        self.id_key = id_key
+        nprng = nprng if nprng is not None else np.random.default_rng()
+        self.order = nprng.permutation(num)      # popularity rank -> row
+        self.cum = {}                            # skew -> cumulative rank weights
+
+    def weights(self,skew):
+        import numpy as np
+        if self.num == 0:
+            raise ValueError(f'table {self.name!r} has no rows to reference')
+        if skew not in self.cum:
+            self.cum[skew] = np.cumsum(np.arange(1,self.num+1,dtype=float)**-skew)
+        return self.cum[skew]
+
+    # num row positions at once
+    def draw(self,nprng,num,skew=1.0):
+        import numpy as np
+        if num == 0:
+            return np.empty(0,dtype=np.int64)
+        cum = self.weights(skew)
+        ranks = np.searchsorted(cum,nprng.random(num)*cum[-1],side='right')
+        return self.order[np.minimum(ranks,self.num-1)]
+
+    # One row position, for row-by-row generation
+    def draw_one(self,rng,skew=1.0):
+        cum = self.weights(skew)
+        rank = bisect.bisect_right(cum,rng.random()*cum[-1])
+        return int(self.order[min(rank,self.num-1)])
+
+    # Values of field for the given rows - field None is the row's id, which is its
+    # ?id column or else its row number counted from 1
+    def take(self,field,rows):
+        if field is None:
+            return self.columns[self.id_key][rows] if self.id_key else rows+1
+        return self.columns[field][rows]
+
+    # take() for a single row, as a plain Python value like those of Column.value()
+    def value(self,field,row):
+        import numpy as np
+        value = self.take(field,row)
+        if isinstance(value,np.datetime64):
+            return date_strings(np.asarray([value]))[0]
+        if hasattr(value,'tzinfo'):                 # pd.Timestamp
+            return str(value)
+        return value.item() if isinstance(value,np.generic) else value
+
+# Each table is a DatasetGenerator seeded from the schema seed and the table's position.
+# rows arguments map table names to row counts and override the [name:rows] headers
+class DatasetSchema:
+    def __init__(self,filename='cfg_gen_schema.txt',seed=None,profile=False):
+        self.seed = seed
+        self.profile = profile
+        self.tables = {}        # table name -> DatasetGenerator
+        self.rows = {}          # table name -> row count from its header
+        self.pools = {}         # table name -> TablePool, once generated
+        self.load(filename)
+
+    # Split the schema file into [table] sections and compile each one
+    def load(self,filename='cfg_gen_schema.txt'):
+        sections = []
+        with open(resource_path(filename),'r',encoding='utf-8') as lines:
+            for lineno,line in enumerate(lines,1):
+                header = SCHEMA_HEADER.match(line)
+                if header:
+                    sections.append((header[1],header[2],[]))
+                elif sections:
+                    sections[-1][2].append((lineno,line))
+                elif line.strip() and not line.startswith('#'):
+                    raise ValueError(f'{filename}:{lineno}: entries must follow a [table] header')
+        for name,rows,entries in sections:
+            self.add_table(name,entries,int(rows) if rows else 100,filename)
+
+    # Compile one table. ?ref columns may only refer to tables defined before it
+    def add_table(self,name,entries,rows=100,filename='<config>'):
+        if name in self.tables:
+            raise ValueError(f'{filename}: table {name!r} is defined twice')
+        seed = None if self.seed is None else [self.seed,len(self.tables)]
+        dataset = DatasetGenerator(seed=seed,profile=self.profile,config=None)
+        dataset.load_entries(entries,filename)
+        for key,column in dataset.columns.items():
+            if column.kind != 'ref':
+                continue
+            target = self.tables.get(column.table)
+            if target is None:
+                raise ValueError(f'{filename}: {name}.{key}: {column.spec!r} refers to a table that is not defined above it')
+            if column.field is not None and column.field not in target.columns:
+                raise ValueError(f'{filename}: {name}.{key}: table {column.table!r} has no column {column.field!r}')
+        dataset.tables = self.pools
+        self.tables[name] = dataset
+        self.rows[name] = rows
+
+    def table_rows(self,name,rows=None):
+        return (rows or {}).get(name,self.rows[name])
+
+    # The table's ?id column, if it has one
+    def id_key(self,table):
+        return next((key for key,column in self.tables[table].columns.items() if column.kind == 'id'),None)
+
+    # Columns of table that other tables ?ref, or None if nothing refers to it
+    def pool_keys(self,table):
+        fields = {column.field for dataset in self.tables.values() for column in dataset.columns.values()
+                  if column.kind == 'ref' and column.table == table}
+        if not fields:
+            return None
+        id_key = self.id_key(table) if None in fields else None
+        return [key for key in self.tables[table].columns if key in fields or key == id_key]
+
+    # Keep the referenced columns of a generated table for the tables after it
+    def add_pool(self,name,columns,num):
+        import numpy as np
+        keys = self.pool_keys(name)
+        if keys is None:
+            return
+        seed = None if self.seed is None else [self.seed,list(self.tables).index(name),1]
+        self.pools[name] = TablePool(name,num,{key: columns[key] for key in keys},self.id_key(name),
+                                     np.random.default_rng(seed))
+
+    # Generate every table in memory. Returns a dict of table name -> column dict
+    def generate(self,rows=None,workers=1):
+        results = {}
+        for name,dataset in self.tables.items():
+            num = self.table_rows(name,rows)
+            results[name] = dataset.generate_columns(num,workers)
+            self.add_pool(name,results[name],num)
+        return results
+
+    # Generate every table as a pandas DataFrame
+    def generate_frames(self,rows=None,workers=1):
+        import pandas as pd
+        return {name: pd.DataFrame(columns) for name,columns in self.generate(rows,workers).items()}
+
+    # Write each table chunk by chunk to its own file, named after the table (data.csv
+    # gives data-users.csv, data-posts.csv, ...). Only the referenced columns are kept
+    def write(self,filename,rows=None,chunk_size=100000,fmt=None,workers=1):
+        check_size(chunk_size)
+        root,ext = os.path.splitext(filename)
+        for name,dataset in self.tables.items():
+            num = self.table_rows(name,rows)
+            keys = self.pool_keys(name)
+            kept = []
+            with DatasetWriter(f'{root}-{name}{ext}',fmt,dictionary=dataset.list_columns()) as writer:
+                for chunk in dataset.iter_chunks(num,chunk_size,workers):
+                    writer.write(chunk)
+                    if keys is not None:
+                        kept.append({key: chunk[key] for key in keys})
+            self.add_pool(name,concat_columns(kept),num)
+
+## ===================================================================================
+##   STREAMING: rows served as NDJSON over a TCP or Unix socket, or to stdout, for
+##   driving ingestion pipelines without a file in between. Batches are generated in
+##   a worker thread one batch ahead of the one being sent, and every write waits for
+##   the consumer (writer.drain()), so a slow client slows generation down instead of
+##   filling memory. With a rate, rows are sent in small slices on a fixed schedule
+## ===================================================================================
+
+STREAM_BATCH = 1000         # rows generated at a time when streaming
+STREAM_TICK = 0.05          # seconds of rows sent per write when a rate is set
+
+# Stands in for an asyncio.StreamWriter on stdout. Writes block until the pipe takes
+# the data, which is all the backpressure stdout needs
+class StdoutWriter:
+    def __init__(self,stream=None):
+        import sys
+        self.stream = stream if stream is not None else sys.stdout.buffer
+
+    def write(self,data):
+        self.stream.write(data)
+
+    async def drain(self):
+        self.stream.flush()
+
+# Streams num rows (endless if None) of dataset to each client, at up to rate rows
+# per second (as fast as the client reads if None)
+class DatasetStreamer:
+    def __init__(self,dataset,num=None,rate=None,batch_size=STREAM_BATCH):
+        if rate is not None and rate <= 0:
+            raise ValueError('rate must be positive')
+        check_size(batch_size,'batch_size')
+        self.dataset = dataset
+        self.num = num
+        self.rate = rate
+        self.batch_size = batch_size
+
+    # Each stream generates from its own copy of the dataset, so concurrent streams do
+    # not share random state. Seeded datasets send every client the same rows
+    def stream_dataset(self):
+        import copy
+        dataset = copy.copy(self.dataset)
+        if dataset.seed is None:
+            dataset.reseed(None)
+        return dataset
+
+    # Next batch as NDJSON bytes, one item per row, or None at the end. Runs in a thread
+    @staticmethod
+    def next_lines(chunks):
+        columns = next(chunks,None)
+        if columns is None:
+            return None
+        return [line.encode('utf-8') for line in jsonl_lines(columns)]
+
+    # Send the rows to writer (an asyncio.StreamWriter or StdoutWriter). Returns the
+    # number of rows sent
+    async def stream(self,writer):
+        import asyncio
+        loop = asyncio.get_running_loop()
+        chunks = self.stream_dataset().iter_chunks(self.num,self.batch_size)
+        pending = loop.run_in_executor(None,self.next_lines,chunks)
+        start = loop.time()
+        sent = 0
+        while True:
+            lines = await pending
+            if lines is None:
+                return sent
+            pending = loop.run_in_executor(None,self.next_lines,chunks)
+            step = len(lines) if self.rate is None else max(1,int(self.rate*STREAM_TICK))
+            for ind in range(0,len(lines),step):
+                if self.rate is not None:
+                    delay = start+sent/self.rate-loop.time()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                part = lines[ind:ind+step]
+                writer.write(b''.join(part))
+                await writer.drain()
+                sent += len(part)
+
+    # One stream per connection. Clients that hang up just end their stream, and on
+    # shutdown unsent rows are dropped rather than waiting for slow clients
+    async def handle(self,reader,writer):
+        import asyncio
+        try:
+            await self.stream(writer)
+        except (ConnectionError,asyncio.CancelledError):
+            writer.transport.abort()
+            return
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except ConnectionError:
+            pass
+
+    # Start serving on host:port, or on the Unix socket path. Returns the asyncio Server
+    async def serve(self,host='127.0.0.1',port=8765,path=None):
+        import asyncio
+        if path is not None:
+            return await asyncio.start_unix_server(self.handle,path)
+        return await asyncio.start_server(self.handle,host,port)
+
+# Runs a DatasetStreamer until interrupted - address is 'PORT', 'HOST:PORT' or the path of
+# a Unix socket, and '-' streams once to stdout
+def run_streamer(streamer,address='-'):
+    import asyncio
+    import sys
+
+    async def main():
+        if address == '-':
+            await streamer.stream(StdoutWriter())
+            return
+        if '/' in address or ':' not in address and not address.isdigit():
+            server = await streamer.serve(path=address)
+        else:
+            host,sep,port = address.rpartition(':')
+            server = await streamer.serve(host or '127.0.0.1',int(port))
+        names = ', '.join(str(sock.getsockname()) for sock in server.sockets)
+        print(f'streaming rows on {names}',file=sys.stderr)
+        async with server:
+            await server.serve_forever()
+
+    try:
+        asyncio.run(main())
+    except (KeyboardInterrupt,BrokenPipeError):
+        pass
+
 ## ===================================================================================
 ##    Main Program
 ## ===================================================================================
 
-dataset = DatasetGenerator()
-results = dataset.generate(100)
-df = pd.DataFrame(results)
-df.to_csv('generated_dataset.csv')
+# argparse type for --chunk-size, --batch-size and --workers
+def positive_int(text):
+    import argparse
+    value = int(text)
+    if value < 1:
+        raise argparse.ArgumentTypeError(f'must be at least 1, not {value}')
+    return value
+
+# main() for --schema: each table goes to its own file and has its own profile
+def write_schema(args,profile):
+    import json
+    import sys
+    rows = {}
+    for item in args.table:
+        name,sep,num = item.partition('=')
+        if not sep or not num.isdigit():
+            raise SystemExit(f'--table expects NAME=ROWS, got {item!r}')
+        rows[name] = int(num)
+    schema = DatasetSchema(args.schema,seed=args.seed,profile=profile)
+    unknown = set(rows)-set(schema.tables)
+    if unknown:
+        raise SystemExit(f'--table: {", ".join(sorted(unknown))} not in {args.schema}')
+    schema.write(args.output,rows,chunk_size=args.chunk_size,workers=args.workers)
+    if args.profile:
+        for name,dataset in schema.tables.items():
+            print(f'[{name}]\n{dataset.stats.report()}',file=sys.stderr)
+    if args.profile_json is not None:
+        with open(args.profile_json,'w') as f:
+            f.write(json.dumps({name: dataset.stats.as_dict() for name,dataset in schema.tables.items()},indent=2)+'\n')
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description='Generate a random dataset from cfg_gen_dataset.txt')
+    parser.add_argument('-n','--rows',type=int,default=None,help='number of rows to generate (default 100, or endless with --serve and --stream)')
+    parser.add_argument('-o','--output',default='generated_dataset.csv',help='output file (.csv, .jsonl, .parquet, .arrow, .feather or .npz)')
+    parser.add_argument('--chunk-size',type=positive_int,default=100000,help='rows generated and written per chunk')
+    parser.add_argument('--workers',type=positive_int,default=1,help='number of worker processes')
+    parser.add_argument('--seed',type=int,default=None,help='master seed for reproducible output')
+    parser.add_argument('--parts',action='store_true',help='write each chunk to its own numbered file')
+    parser.add_argument('--resume',action='store_true',help='write numbered chunk files with a manifest, continuing the job if it was interrupted')
+    parser.add_argument('--append',type=int,default=None,metavar='ROWS',help='add ROWS rows to the --resume job at --output')
+    parser.add_argument('--stream',action='store_true',help='write rows to stdout as NDJSON instead of to a file')
+    parser.add_argument('--serve',default=None,metavar='ADDRESS',help='serve rows as NDJSON to every client of a socket ([HOST:]PORT or a Unix socket path)')
+    parser.add_argument('--rate',type=float,default=None,help='rows per second for --stream and --serve (default: as fast as the client reads)')
+    parser.add_argument('--batch-size',type=positive_int,default=STREAM_BATCH,help='rows generated at a time for --stream and --serve')
+    parser.add_argument('--profile',action='store_true',help='print time spent per column to stderr')
+    parser.add_argument('--profile-json',default=None,help='write the per-column profile to this JSON file')
+    parser.add_argument('--schema',default=None,help='generate the related tables of a schema file (eg. cfg_gen_schema.txt), one output file per table')
+    parser.add_argument('--table',action='append',default=[],metavar='NAME=ROWS',help='row count for one table of --schema')
+    args = parser.parse_args(argv)
+
+    profile = args.profile or args.profile_json is not None
+    if args.schema is not None:
+        write_schema(args,profile)
+        return
+    dataset = DatasetGenerator(seed=args.seed,profile=profile)
+    if args.stream or args.serve is not None:
+        streamer = DatasetStreamer(dataset,args.rows,args.rate,args.batch_size)
+        run_streamer(streamer,args.serve if args.serve is not None else '-')
+        return
+    rows = args.rows if args.rows is not None else 100
+    if args.append is not None:
+        DatasetJob(dataset,args.output,args.chunk_size).append(args.append,args.workers)
+    elif args.resume:
+        dataset.write_job(args.output,rows,chunk_size=args.chunk_size,workers=args.workers)
+    else:
+        dataset.write(args.output,rows,chunk_size=args.chunk_size,workers=args.workers,parts=args.parts)
+    if args.profile:
+        import sys
+        print(dataset.stats.report(),file=sys.stderr)
+    if args.profile_json is not None:
+        with open(args.profile_json,'w') as f:
+            f.write(dataset.stats.to_json()+'\n')
+
+if __name__ == '__main__':
+    main()